@@ -1,10 +1,21 @@
 import streamlit as st
 import config
-from utils.ai_helper import generate_itinerary
-from utils.map_helper import create_travel_map
-from utils.pdf_generator import generate_itinerary_pdf
-from streamlit_folium import folium_static
+from utils.ai_helper import generate_itinerary_stream, regenerate_days
+from utils.map_helper import geocode_resolver, itinerary_places, locate_places, place_lookups, travel_map_html
+from utils.pdf_generator import get_itinerary_pdf
+import streamlit.components.v1 as components
+from utils import metrics, request_log
+from utils.cache import cache_stats
+from utils.geocoder import wait_for
+from utils.itinerary_store import itinerary_store
+from utils.models import Day, Itinerary
+from utils.routing import optimize_itinerary
+from utils.scheduler import current_session, llm_scheduler
 import pandas as pd
+import queue
+import threading
+import time
+import uuid
 from datetime import datetime, timedelta
 
 # Page configuration
@@ -33,7 +44,7 @@ st.markdown("""
         text-align: center;
         margin-bottom: 30px;
     }
-    .stButton>button {
+    .stButton>button, [data-testid="stFormSubmitButton"]>button {
         background-color: #2E86AB;
         color: white;
         font-size: 16px;
@@ -42,7 +53,7 @@ st.markdown("""
         border: none;
         width: 100%;
     }
-    .stButton>button:hover {
+    .stButton>button:hover, [data-testid="stFormSubmitButton"]>button:hover {
         background-color: #A23B72;
         color: white;
     }
@@ -62,11 +73,106 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
+
+def render_day(day, expanded=True):
+    """Render one day of the itinerary as an expander"""
+    with st.expander(f"**Day {day.day}: {day.title}** - Estimated Cost: ${day.daily_cost}", expanded=expanded):
+        
+        # Activities
+        st.markdown("### 🎯 Activities")
+        for activity in day.activities:
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.markdown(f"**{activity.time}** - {activity.activity}")
+                if activity.tips:
+                    st.info(f"💡 {activity.tips}")
+            with col2:
+                if activity.cost:
+                    st.markdown(f'<span class="cost-badge">${activity.cost}</span>', unsafe_allow_html=True)
+            st.markdown("")
+        
+        # Meals
+        if day.meals:
+            st.markdown("### 🍽️ Meals")
+            meal_cols = st.columns(3)
+            with meal_cols[0]:
+                st.markdown(f"**Breakfast:** {day.meals.breakfast}")
+            with meal_cols[1]:
+                st.markdown(f"**Lunch:** {day.meals.lunch}")
+            with meal_cols[2]:
+                st.markdown(f"**Dinner:** {day.meals.dinner}")
+        
+        # Accommodation
+        if day.accommodation:
+            st.markdown("### 🏨 Accommodation")
+            st.markdown(f"{day.accommodation}")
+
+
+def budget_dataframe(breakdown):
+    """Build the budget breakdown table for an itinerary"""
+    with metrics.span("budget_dataframe"):
+        return pd.DataFrame({
+            'Category': [k.replace('_', ' ').title() for k, _ in breakdown],
+            'Amount ($)': [v for _, v in breakdown]
+        })
+
+
+def stream_itinerary_events(events, session_id, request):
+    """Run a streaming generation for a session, forwarding its events to a queue"""
+    current_session.set(session_id)
+    try:
+        for event in generate_itinerary_stream(**request):
+            events.put(event)
+    except Exception as e:
+        events.put(("error", e))
+    finally:
+        events.put(None)
+
+
+def regenerate_selected_days(itinerary):
+    """Replan the days picked in the regenerate form and point the session at the updated itinerary"""
+    request = st.session_state.trip_request
+    # Read from the widgets' state at click time; values bound when the button was drawn can be stale
+    first_day = last_day = itinerary.days[0].day
+    if len(itinerary.days) > 1:
+        first_day, last_day = st.session_state.get("regenerate_days", (first_day, last_day))
+    feedback = st.session_state.get("regenerate_feedback", "")
+    token = current_session.set(st.session_state.session_id)
+    try:
+        with st.spinner(f"✨ Replanning days {first_day}-{last_day}..."):
+            updated = regenerate_days(
+                itinerary, first_day, last_day,
+                travel_style=request['travel_style'],
+                interests=request['interests'],
+                start_date=request['start_date'],
+                feedback=feedback
+            )
+    finally:
+        current_session.reset(token)
+    st.session_state.itinerary_key = itinerary_store.put(updated, st.session_state.session_id)
+
+
+def optimize_routes(itinerary):
+    """Reorder each day into a shorter route between the places located so far"""
+    places = itinerary_places(itinerary.destination, itinerary)
+    coordinates, _ = locate_places(itinerary.destination, places)
+    optimized, report = optimize_itinerary(itinerary, coordinates)
+    if report['saved_km'] > 0:
+        st.session_state.itinerary_key = itinerary_store.put(optimized, st.session_state.session_id)
+    st.session_state.route_report = (st.session_state.itinerary_key, report)
+
+
+# Prometheus scrape endpoint, when METRICS_PORT is set; started once per process
+metrics.start_http_server()
+
 # Initialize session state
-if 'itinerary' not in st.session_state:
-    st.session_state.itinerary = None
+# The itinerary itself lives in the shared store; sessions only keep its key
 if 'show_itinerary' not in st.session_state:
     st.session_state.show_itinerary = False
+if 'itinerary_key' not in st.session_state:
+    st.session_state.itinerary_key = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Header
 st.markdown('<h1 class="main-header">🎒 Student Travel Planner</h1>', unsafe_allow_html=True)
@@ -76,227 +182,286 @@ st.markdown('<p class="sub-header">AI-Powered Budget Travel Planning for Student
 with st.sidebar:
     st.header("✈️ Plan Your Trip")
     
-    # Destination input
-    destination = st.text_input(
-        "📍 Where do you want to go?",
-        placeholder="e.g., Paris, Tokyo, New York",
-        help="Enter any city or country"
-    )
-    
-    # Trip duration
-    days = st.slider(
-        "📅 How many days?",
-        min_value=1,
-        max_value=30,
-        value=5,
-        help="Select the duration of your trip"
-    )
-    
-    # Start date
-    start_date = st.date_input(
-        "🗓️ Start Date",
-        value=datetime.now() + timedelta(days=30),
-        min_value=datetime.now()
-    )
-    
-    # Budget
+    # The budget range sets the bounds of the budget input, so it has to rerun on change
     budget_range = st.select_slider(
         "💰 Budget Range",
         options=list(config.BUDGET_RANGES.keys()),
         value="Budget"
     )
-    
     min_budget, max_budget = config.BUDGET_RANGES[budget_range]
-    budget = st.number_input(
-        f"Specific Budget (${min_budget}-${max_budget})",
-        min_value=min_budget,
-        max_value=max_budget,
-        value=(min_budget + max_budget) // 2,
-        step=100
-    )
     
-    # Travel style
-    travel_style = st.selectbox(
-        "🎨 Travel Style",
-        config.TRAVEL_STYLES,
-        help="What kind of experience are you looking for?"
-    )
+    # Everything else is batched in a form so edits don't rerun the app until submitted
+    with st.form("trip_form", border=False):
+        # Destination input
+        destination = st.text_input(
+            "📍 Where do you want to go?",
+            placeholder="e.g., Paris, Tokyo, New York",
+            help="Enter any city or country"
+        )
+        
+        # Trip duration
+        days = st.slider(
+            "📅 How many days?",
+            min_value=1,
+            max_value=30,
+            value=5,
+            help="Select the duration of your trip"
+        )
+        
+        # Start date
+        start_date = st.date_input(
+            "🗓️ Start Date",
+            value=datetime.now() + timedelta(days=30),
+            min_value=datetime.now()
+        )
+        
+        # Budget
+        budget = st.number_input(
+            f"Specific Budget (${min_budget}-${max_budget})",
+            min_value=min_budget,
+            max_value=max_budget,
+            value=(min_budget + max_budget) // 2,
+            step=100
+        )
+        
+        # Travel style
+        travel_style = st.selectbox(
+            "🎨 Travel Style",
+            config.TRAVEL_STYLES,
+            help="What kind of experience are you looking for?"
+        )
+        
+        # Additional interests
+        interests = st.text_area(
+            "💭 Additional Interests",
+            placeholder="e.g., photography, hiking, local cuisine, nightlife",
+            help="Any specific interests or activities you want to include?"
+        )
+        
+        st.markdown("---")
+        
+        # Generate button
+        generate_btn = st.form_submit_button("🚀 Generate Itinerary", type="primary")
+
+# Main content area
+if generate_btn and destination:
+    # Render each day as soon as it arrives instead of waiting for the whole trip
+    preview = st.empty()
+    with preview.container():
+        status_slot = st.empty()
+        status_slot.info("✨ Creating your perfect itinerary... Days will appear as they are planned!")
+        overview_slot = st.empty()
+        days_container = st.container()
     
-    # Additional interests
-    interests = st.text_area(
-        "💭 Additional Interests",
-        placeholder="e.g., photography, hiking, local cuisine, nightlife",
-        help="Any specific interests or activities you want to include?"
+    trip_request = dict(
+        destination=destination,
+        days=days,
+        budget=budget,
+        travel_style=travel_style,
+        interests=interests,
+        start_date=start_date.strftime("%Y-%m-%d")
     )
     
-    st.markdown("---")
+    # Logged so the cache warmer can learn which trips are popular
+    request_log.record(trip_request)
     
-    # Generate button
-    generate_btn = st.button("🚀 Generate Itinerary", type="primary")
-
-# Main content area
-if generate_btn and destination:
-    with st.spinner("✨ Creating your perfect itinerary... This may take a moment!"):
-        try:
-            # Generate itinerary using AI
-            itinerary = generate_itinerary(
-                destination=destination,
-                days=days,
-                budget=budget,
-                travel_style=travel_style,
-                interests=interests,
-                start_date=start_date.strftime("%Y-%m-%d")
-            )
-            
-            st.session_state.itinerary = itinerary
-            st.session_state.show_itinerary = True
-            st.success("✅ Itinerary generated successfully!")
+    # Generation runs on a worker thread so this script can report the queue position meanwhile
+    events = queue.Queue()
+    threading.Thread(
+        target=stream_itinerary_events,
+        args=(events, st.session_state.session_id, trip_request),
+        daemon=True
+    ).start()
+    
+    try:
+        itinerary = None
+        while True:
+            try:
+                event = events.get(timeout=0.5)
+            except queue.Empty:
+                queued = llm_scheduler.position(st.session_state.session_id)
+                if queued:
+                    status_slot.info(f"⏳ The planner is busy. You are #{queued[0]} in line "
+                                     f"(estimated wait ~{queued[1]:.0f}s)")
+                else:
+                    status_slot.info("✨ Creating your perfect itinerary... Days will appear as they are planned!")
+                continue
             
-        except Exception as e:
-            st.error(f"❌ Error generating itinerary: {str(e)}")
-            st.info("💡 Make sure you have configured your API key in config.py or try again.")
+            if event is None:
+                break
+            elif event[0] == "error":
+                raise event[1]
+            elif event[0] == "day":
+                with days_container:
+                    render_day(Day.from_dict(event[1]), expanded=False)
+            elif event[0] == "section" and event[1] == "overview":
+                overview_slot.markdown(f"**Overview:** {event[2]}")
+            elif event[0] == "done":
+                itinerary = event[1]
+        
+        # Validated once here; the UI, map and PDF all read the same model
+        itinerary = Itinerary.from_dict(itinerary)
+        preview.empty()
+        st.session_state.itinerary_key = itinerary_store.put(itinerary, st.session_state.session_id)
+        st.session_state.trip_request = trip_request
+        st.session_state.show_itinerary = True
+        st.success("✅ Itinerary generated successfully!")
+        
+    except Exception as e:
+        preview.empty()
+        st.error(f"❌ Error generating itinerary: {str(e)}")
+        st.info("💡 Make sure you have configured your API key in config.py or try again.")
 
 elif generate_btn and not destination:
     st.warning("⚠️ Please enter a destination!")
 
 # Display itinerary
-if st.session_state.show_itinerary and st.session_state.itinerary:
-    itinerary = st.session_state.itinerary
+itinerary = None
+pending_places = 0
+if st.session_state.show_itinerary:
+    itinerary = itinerary_store.get(st.session_state.itinerary_key, st.session_state.session_id)
+    if itinerary is None:
+        st.session_state.show_itinerary = False
+        st.info("💡 This itinerary has expired. Please generate it again.")
+
+if itinerary is not None:
+    itinerary_key = st.session_state.itinerary_key
     
     # Overview section
     st.markdown("## 🌍 Trip Overview")
     
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Destination", itinerary['destination'])
+        st.metric("Destination", itinerary.destination)
     with col2:
-        st.metric("Duration", f"{len(itinerary.get('days', []))} Days")
+        st.metric("Duration", f"{len(itinerary.days)} Days")
     with col3:
-        st.metric("Total Budget", f"${itinerary.get('total_estimated_cost', budget)}")
+        st.metric("Total Budget", f"${itinerary.total_estimated_cost or budget}")
     with col4:
-        st.metric("Daily Budget", f"${itinerary.get('daily_budget', 0)}")
+        st.metric("Daily Budget", f"${itinerary.daily_budget}")
     
-    st.markdown(f"**Overview:** {itinerary.get('overview', 'Enjoy your trip!')}")
+    st.markdown(f"**Overview:** {itinerary.overview or 'Enjoy your trip!'}")
     
     st.markdown("---")
     
-    # Map section
+    # Map section; places that aren't located yet are added at the end of the run
     st.markdown("## 🗺️ Interactive Map")
-    travel_map = create_travel_map(destination, itinerary)
-    folium_static(travel_map, width=1200, height=500)
+    map_html, pending_places = travel_map_html(itinerary.destination, itinerary)
+    components.html(map_html, width=1200, height=510)
+    map_status = st.empty()
+    if pending_places:
+        map_status.caption(f"📍 Locating {pending_places} more places...")
+    
+    st.button("🧭 Optimize Daily Routes", on_click=optimize_routes, args=(itinerary,),
+              help="Reorder each day's stops to cut travel between them; meals keep their time slot")
+    route_report = st.session_state.get('route_report')
+    if route_report and route_report[0] == itinerary_key:
+        report = route_report[1]
+        reordered = sum(day['reordered'] for day in report['days'])
+        if reordered:
+            st.success(f"🧭 Reordered {reordered} days, saving about {report['saved_km']:.1f} km of travel "
+                       f"({report['before_km']:.1f} → {report['after_km']:.1f} km in straight lines)")
+        else:
+            st.info("🧭 Your days are already in a good order")
     
     st.markdown("---")
     
     # Daily itinerary
     st.markdown("## 📅 Daily Itinerary")
     
-    for day in itinerary.get('days', []):
-        with st.expander(f"**Day {day['day']}: {day['title']}** - Estimated Cost: ${day.get('daily_cost', 0)}", expanded=True):
-            
-            # Activities
-            st.markdown("### 🎯 Activities")
-            for activity in day.get('activities', []):
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    st.markdown(f"**{activity['time']}** - {activity['activity']}")
-                    if activity.get('tips'):
-                        st.info(f"💡 {activity['tips']}")
-                with col2:
-                    if activity.get('cost'):
-                        st.markdown(f'<span class="cost-badge">${activity["cost"]}</span>', unsafe_allow_html=True)
-                st.markdown("")
-            
-            # Meals
-            if day.get('meals'):
-                st.markdown("### 🍽️ Meals")
-                meal_cols = st.columns(3)
-                with meal_cols[0]:
-                    st.markdown(f"**Breakfast:** {day['meals'].get('breakfast', 'N/A')}")
-                with meal_cols[1]:
-                    st.markdown(f"**Lunch:** {day['meals'].get('lunch', 'N/A')}")
-                with meal_cols[2]:
-                    st.markdown(f"**Dinner:** {day['meals'].get('dinner', 'N/A')}")
+    for day in itinerary.days:
+        render_day(day)
+    
+    # Regenerate only the days the traveler doesn't like
+    if itinerary.days and 'trip_request' in st.session_state:
+        with st.expander("🔄 Not happy with some days? Regenerate them"):
+            day_numbers = [day.day for day in itinerary.days]
+            if len(day_numbers) > 1:
+                st.select_slider(
+                    "Days to regenerate",
+                    options=day_numbers,
+                    value=(day_numbers[0], day_numbers[0]),
+                    key="regenerate_days"
+                )
+            st.text_input("What would you like instead?",
+                          placeholder="e.g., more outdoor activities, cheaper food",
+                          key="regenerate_feedback")
             
-            # Accommodation
-            if day.get('accommodation'):
-                st.markdown("### 🏨 Accommodation")
-                st.markdown(f"{day['accommodation']}")
+            # Runs as a callback so the new days are in place before the page is redrawn
+            st.button("🔄 Regenerate Selected Days", on_click=regenerate_selected_days,
+                      args=(itinerary,))
     
     st.markdown("---")
     
     # Budget breakdown
-    if 'budget_breakdown' in itinerary:
+    if itinerary.budget_breakdown is not None:
         st.markdown("## 💰 Budget Breakdown")
         
-        breakdown = itinerary['budget_breakdown']
-        df = pd.DataFrame({
-            'Category': [k.replace('_', ' ').title() for k in breakdown.keys()],
-            'Amount ($)': list(breakdown.values())
-        })
+        df = budget_dataframe(itinerary.budget_breakdown)
         
         col1, col2 = st.columns([2, 1])
-        with col1:
-            st.bar_chart(df.set_index('Category'))
-        with col2:
-            st.dataframe(df, hide_index=True)
+        with metrics.span("budget_chart"):
+            with col1:
+                st.bar_chart(df, x='Category', y='Amount ($)')
+            with col2:
+                st.dataframe(df, hide_index=True)
         
         st.markdown("---")
     
     # Accommodation options
-    if 'accommodation_options' in itinerary:
+    if itinerary.accommodation_options:
         st.markdown("## 🏨 Accommodation Options")
         
-        acc_cols = st.columns(len(itinerary['accommodation_options']))
-        for idx, acc in enumerate(itinerary['accommodation_options']):
+        acc_cols = st.columns(len(itinerary.accommodation_options))
+        for idx, acc in enumerate(itinerary.accommodation_options):
             with acc_cols[idx]:
-                st.markdown(f"### {acc['name']}")
-                st.markdown(f"**Type:** {acc['type']}")
-                st.markdown(f"**Price/Night:** ${acc['price_per_night']}")
-                st.info(f"💡 {acc['tips']}")
+                st.markdown(f"### {acc.name}")
+                st.markdown(f"**Type:** {acc.type}")
+                st.markdown(f"**Price/Night:** ${acc.price_per_night}")
+                st.info(f"💡 {acc.tips}")
         
         st.markdown("---")
     
     # Transportation
-    if 'transportation' in itinerary:
+    if itinerary.transportation is not None:
         st.markdown("## 🚌 Transportation")
         
-        trans = itinerary['transportation']
+        trans = itinerary.transportation
         col1, col2 = st.columns(2)
         with col1:
-            st.markdown(f"**Getting There:** {trans.get('getting_there', 'N/A')}")
+            st.markdown(f"**Getting There:** {trans.getting_there}")
         with col2:
-            st.markdown(f"**Local Transport:** {trans.get('local_transport', 'N/A')}")
+            st.markdown(f"**Local Transport:** {trans.local_transport}")
         
-        st.markdown(f"**Estimated Cost:** ${trans.get('estimated_cost', 0)}")
+        st.markdown(f"**Estimated Cost:** ${trans.estimated_cost}")
         st.markdown("---")
     
     # Money saving tips
-    if 'money_saving_tips' in itinerary:
+    if itinerary.money_saving_tips is not None:
         st.markdown("## 💡 Money Saving Tips")
         
         tips_cols = st.columns(2)
-        for idx, tip in enumerate(itinerary['money_saving_tips']):
+        for idx, tip in enumerate(itinerary.money_saving_tips):
             with tips_cols[idx % 2]:
                 st.success(f"✅ {tip}")
         
         st.markdown("---")
     
     # Essential information
-    if 'essential_info' in itinerary:
+    if itinerary.essential_info is not None:
         st.markdown("## ℹ️ Essential Information")
         
-        info = itinerary['essential_info']
-        
         col1, col2 = st.columns(2)
         with col1:
-            st.markdown(f"**Best Time to Visit:** {info.get('best_time_to_visit', 'N/A')}")
-            st.markdown(f"**Currency:** {info.get('currency', 'N/A')}")
+            st.markdown(f"**Best Time to Visit:** {itinerary.essential('best_time_to_visit')}")
+            st.markdown(f"**Currency:** {itinerary.essential('currency')}")
         with col2:
-            st.markdown(f"**Language:** {info.get('language', 'N/A')}")
+            st.markdown(f"**Language:** {itinerary.essential('language')}")
         
-        if 'safety_tips' in info:
+        safety_tips = itinerary.essential('safety_tips', None)
+        if safety_tips:
             st.markdown("**Safety Tips:**")
-            for tip in info['safety_tips']:
+            for tip in (safety_tips if isinstance(safety_tips, tuple) else (safety_tips,)):
                 st.warning(f"⚠️ {tip}")
     
     st.markdown("---")
@@ -309,16 +474,15 @@ if st.session_state.show_itinerary and st.session_state.itinerary:
     with col1:
         if st.button("📄 Download as PDF"):
             try:
-                pdf_filename = f"{destination.replace(' ', '_')}_itinerary.pdf"
-                generate_itinerary_pdf(itinerary, pdf_filename)
+                pdf_filename = f"{itinerary.destination.replace(' ', '_')}_itinerary.pdf"
+                pdf_bytes = get_itinerary_pdf(itinerary)
                 
-                with open(pdf_filename, "rb") as file:
-                    st.download_button(
-                        label="⬇️ Download PDF",
-                        data=file,
-                        file_name=pdf_filename,
-                        mime="application/pdf"
-                    )
+                st.download_button(
+                    label="⬇️ Download PDF",
+                    data=pdf_bytes,
+                    file_name=pdf_filename,
+                    mime="application/pdf"
+                )
                 st.success("✅ PDF generated successfully!")
             except Exception as e:
                 st.error(f"❌ Error generating PDF: {str(e)}")
@@ -359,4 +523,44 @@ with st.sidebar:
     """)
     
     st.markdown("---")
-    st.markdown("**Need help?** Check our documentation or contact support.")
\ No newline at end of file
+    st.markdown("**Need help?** Check our documentation or contact support.")
+    
+    if config.METRICS_DEBUG_PANEL:
+        with st.expander("🛠️ Performance Metrics"):
+            counters, timings = metrics.snapshot()
+            if timings:
+                st.markdown("**Stage timings**")
+                st.dataframe(pd.DataFrame([
+                    {
+                        'Stage': stage,
+                        'Labels': ", ".join(f"{k}={v}" for k, v in labels),
+                        'Count': timing['count'],
+                        'Avg (ms)': round(timing['sum'] / timing['count'] * 1000, 1),
+                        'Max (ms)': round(timing['max'] * 1000, 1)
+                    }
+                    for (stage, labels), timing in sorted(timings.items())
+                ]), hide_index=True)
+            if counters:
+                st.markdown("**Counters**")
+                st.dataframe(pd.DataFrame([
+                    {'Counter': name, 'Labels': ", ".join(f"{k}={v}" for k, v in labels), 'Value': value}
+                    for (name, labels), value in sorted(counters.items())
+                ]), hide_index=True)
+            st.markdown("**Model queue**")
+            st.json(llm_scheduler.stats())
+            st.markdown("**Geocoding queue**")
+            st.json(geocode_resolver.stats())
+            st.markdown("**Disk cache**")
+            st.json(cache_stats())
+
+# Places that weren't cached show up on the map as their lookups finish. This runs
+# last so the rest of the page doesn't wait on the one-request-per-second geocoder
+if pending_places:
+    # Each run stays short: wait briefly for lookups, then rerun to draw the places that arrived
+    map_wait = st.session_state.get('map_wait')
+    if not map_wait or map_wait[0] != itinerary_key:
+        map_wait = st.session_state.map_wait = (itinerary_key, time.monotonic())
+    if time.monotonic() - map_wait[1] < config.GEOCODE_WAIT_TIMEOUT:
+        wait_for(place_lookups(itinerary.destination, itinerary), config.MAP_REFRESH_INTERVAL)
+        st.rerun()
+    map_status.caption(f"📍 {pending_places} places couldn't be located yet; they'll appear next time")
@@ -0,0 +1,184 @@
+"""
+Headless batch mode: generate itineraries and PDFs for a file of trip requests.
+
+Usage:
+    python batch.py trips.jsonl --output-dir batch_output
+    python batch.py trips.csv --output-dir batch_output --concurrency 8 --pdf-workers 4
+
+Each request needs destination, days, budget, travel_style, interests and
+start_date, plus an optional id. Results are written to
+<output-dir>/itineraries and <output-dir>/pdfs, with a per-item status in
+<output-dir>/manifest.json. Items the model fails to generate are marked
+failed rather than filled in from the template. Rerunning with the same
+output directory retries them and skips items that are already completed.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import config
+from utils import cache
+from utils.ai_helper import agenerate_itinerary, close_async_client
+from utils.pdf_generator import generate_itinerary_pdf
+
+REQUEST_FIELDS = ["destination", "days", "budget", "travel_style", "interests", "start_date"]
+
+
+def load_requests(path):
+    """Read trip requests from a .csv or .jsonl file"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    requests = []
+    for line_number, row in enumerate(rows, start=1):
+        missing = [field for field in REQUEST_FIELDS if field not in row and field != "interests"]
+        if missing:
+            raise ValueError(f"Request {line_number} is missing {', '.join(missing)}")
+
+        request = {
+            "destination": str(row["destination"]).strip(),
+            "days": int(row["days"]),
+            "budget": int(float(row["budget"])),
+            "travel_style": str(row["travel_style"]).strip(),
+            "interests": str(row.get("interests") or "").strip(),
+            "start_date": str(row["start_date"]).strip()
+        }
+        item_id = str(row.get("id") or "").strip()
+        if not item_id:
+            item_id = cache.make_key(*(request[field] for field in REQUEST_FIELDS))[:16]
+        requests.append((item_id, request))
+
+    return requests
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _load_manifest(path):
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def _render_pdf(itinerary_path, pdf_path):
+    with open(itinerary_path, encoding="utf-8") as f:
+        itinerary = json.load(f)
+    generate_itinerary_pdf(itinerary, pdf_path)
+    return pdf_path
+
+
+async def _generate_pending(pending, output_dir, manifest, manifest_path, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item_id, request):
+        async with semaphore:
+            try:
+                # Without the template fallback a failed item stays failed, so a rerun retries it
+                return item_id, await agenerate_itinerary(**request, fallback=False), None
+            except Exception as e:
+                return item_id, None, str(e)
+
+    tasks = [run(item_id, request) for item_id, request in pending]
+    try:
+        for future in asyncio.as_completed(tasks):
+            item_id, itinerary, error = await future
+            entry = manifest[item_id]
+            if error:
+                entry.update(status="failed", error=error)
+            else:
+                itinerary_path = os.path.join(output_dir, "itineraries", f"{item_id}.json")
+                _write_json(itinerary_path, itinerary)
+                entry.update(status="generated", itinerary=itinerary_path, error=None)
+            _write_json(manifest_path, manifest)
+            print(f"[{entry['status']}] {item_id} {entry['request']['destination']}")
+    finally:
+        # The loop ends with asyncio.run, so its pooled connections are closed first
+        await close_async_client()
+
+
+def run_batch(input_path, output_dir, concurrency=None, pdf_workers=None, render_pdfs=True):
+    """Generate every request in input_path and return the manifest"""
+    os.makedirs(os.path.join(output_dir, "itineraries"), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, "pdfs"), exist_ok=True)
+
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    manifest = _load_manifest(manifest_path)
+
+    pending = []
+    for item_id, request in load_requests(input_path):
+        entry = manifest.get(item_id)
+        if entry and entry.get("request") == request and entry.get("itinerary") \
+                and os.path.exists(entry["itinerary"]):
+            continue
+        manifest[item_id] = {"request": request, "status": "pending", "itinerary": None, "pdf": None, "error": None}
+        pending.append((item_id, request))
+
+    _write_json(manifest_path, manifest)
+    print(f"{len(pending)} itineraries to generate, {len(manifest) - len(pending)} already done")
+
+    if pending:
+        asyncio.run(_generate_pending(pending, output_dir, manifest, manifest_path,
+                                      concurrency or config.BATCH_CONCURRENCY))
+
+    if render_pdfs:
+        to_render = [
+            item_id for item_id, entry in manifest.items()
+            if entry.get("itinerary") and not (entry.get("pdf") and os.path.exists(entry["pdf"]))
+        ]
+        print(f"{len(to_render)} PDFs to render")
+
+        # PDF layout is CPU-bound, so it runs in separate processes
+        with ProcessPoolExecutor(max_workers=pdf_workers) as executor:
+            futures = {
+                executor.submit(_render_pdf, manifest[item_id]["itinerary"],
+                                os.path.join(output_dir, "pdfs", f"{item_id}.pdf")): item_id
+                for item_id in to_render
+            }
+            for future in as_completed(futures):
+                item_id = futures[future]
+                entry = manifest[item_id]
+                try:
+                    entry.update(status="completed", pdf=future.result(), error=None)
+                except Exception as e:
+                    entry.update(status="pdf_failed", error=str(e))
+                _write_json(manifest_path, manifest)
+                print(f"[{entry['status']}] {item_id} {entry['request']['destination']}")
+    else:
+        for entry in manifest.values():
+            if entry["status"] == "generated":
+                entry["status"] = "completed"
+        _write_json(manifest_path, manifest)
+
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate itineraries and PDFs for a batch of trip requests")
+    parser.add_argument("input", help="CSV or JSONL file of trip requests")
+    parser.add_argument("--output-dir", default="batch_output", help="Directory for itineraries, PDFs and the manifest")
+    parser.add_argument("--concurrency", type=int, default=None, help="Concurrent itinerary generations")
+    parser.add_argument("--pdf-workers", type=int, default=None, help="Processes used for PDF rendering")
+    parser.add_argument("--no-pdf", action="store_true", help="Skip PDF rendering")
+    args = parser.parse_args(argv)
+
+    manifest = run_batch(args.input, args.output_dir, concurrency=args.concurrency,
+                         pdf_workers=args.pdf_workers, render_pdfs=not args.no_pdf)
+
+    failed = [item_id for item_id, entry in manifest.items() if entry["status"] != "completed"]
+    print(f"Done: {len(manifest) - len(failed)} completed, {len(failed)} not completed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
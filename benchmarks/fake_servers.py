@@ -0,0 +1,150 @@
+"""
+Local HTTP servers that speak just enough of the Anthropic messages API and
+the Nominatim search API for the app to run against them unchanged.
+
+Point the app at them with config.ANTHROPIC_BASE_URL and
+config.NOMINATIM_DOMAIN / NOMINATIM_SCHEME. Responses come from the same
+deterministic generators as benchmarks/fakes.py.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from benchmarks.fakes import _rng, fake_coordinates, fake_model_text
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _AnthropicHandler(_Handler):
+    def do_POST(self):
+        settings = self.server.settings
+        if urlparse(self.path).path != "/v1/messages":
+            self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        prompt = request["messages"][-1]["content"]
+        with self.server.lock:
+            self.server.calls += 1
+            rng = _rng(settings["seed"], prompt, self.server.calls)
+
+        time.sleep(settings["latency"])
+        if rng.random() < settings["error_rate"]:
+            self._send_json(429, {"type": "error", "error": {"type": "rate_limit_error", "message": "Fake rate limit"}},
+                            headers={"retry-after": "0"})
+            return
+
+        text = fake_model_text(prompt, settings["seed"])
+        stop_reason = "end_turn"
+        if rng.random() < settings["truncate_rate"]:
+            text = text[:int(len(text) * rng.uniform(0.4, 0.95))]
+            stop_reason = "max_tokens"
+        usage = {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4}
+
+        if request.get("stream"):
+            self._stream(request, text, stop_reason, usage)
+            return
+
+        time.sleep(usage["output_tokens"] * settings["token_latency"])
+        self._send_json(200, {
+            "id": f"msg_fake_{self.server.calls}",
+            "type": "message",
+            "role": "assistant",
+            "model": request.get("model", "fake"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": usage
+        })
+
+    def _stream(self, request, text, stop_reason, usage):
+        settings = self.server.settings
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def event(name, data):
+            self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event("message_start", {"type": "message_start", "message": {
+            "id": f"msg_fake_{self.server.calls}", "type": "message", "role": "assistant",
+            "model": request.get("model", "fake"), "content": [], "stop_reason": None, "stop_sequence": None,
+            "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 1}
+        }})
+        event("content_block_start", {"type": "content_block_start", "index": 0,
+                                      "content_block": {"type": "text", "text": ""}})
+        size = settings["stream_chunk_chars"]
+        for start in range(0, len(text), size):
+            chunk = text[start:start + size]
+            if settings["token_latency"]:
+                time.sleep(len(chunk) / 4 * settings["token_latency"])
+            event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                          "delta": {"type": "text_delta", "text": chunk}})
+        event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        event("message_delta", {"type": "message_delta", "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                                "usage": {"output_tokens": usage["output_tokens"]}})
+        event("message_stop", {"type": "message_stop"})
+        self.close_connection = True
+
+
+class _NominatimHandler(_Handler):
+    def do_GET(self):
+        settings = self.server.settings
+        url = urlparse(self.path)
+        if url.path != "/search":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        query = parse_qs(url.query).get("q", [""])[0]
+        with self.server.lock:
+            self.server.calls += 1
+            rng = _rng(settings["seed"], query, self.server.calls)
+        time.sleep(settings["latency"])
+
+        if rng.random() < settings["error_rate"]:
+            self._send_json(503, {"error": "Fake geocoder unavailable"})
+            return
+        lat, lon = fake_coordinates(query)
+        self._send_json(200, [{"lat": str(lat), "lon": str(lon), "display_name": query,
+                               "place_id": abs(hash(query)) % 10 ** 8}])
+
+
+def _start(handler, port, settings):
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.settings = settings
+    server.lock = threading.Lock()
+    server.calls = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_fake_anthropic(port=0, latency=0.0, token_latency=0.0, truncate_rate=0.0, error_rate=0.0,
+                         seed=0, stream_chunk_chars=40):
+    """Start the fake messages API on a background thread; the base URL is http://127.0.0.1:<server.server_port>"""
+    return _start(_AnthropicHandler, port, dict(latency=latency, token_latency=token_latency,
+                                                truncate_rate=truncate_rate, error_rate=error_rate,
+                                                seed=seed, stream_chunk_chars=stream_chunk_chars))
+
+
+def start_fake_nominatim(port=0, latency=0.0, error_rate=0.0, seed=0):
+    """Start the fake Nominatim search API on a background thread"""
+    return _start(_NominatimHandler, port, dict(latency=latency, error_rate=error_rate, seed=seed))
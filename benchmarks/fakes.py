@@ -0,0 +1,245 @@
+"""
+Deterministic local stand-ins for the Anthropic messages API and the Nominatim geocoder.
+
+The fake model answers the prompts built in utils/ai_helper.py (full
+itineraries, long-trip skeletons and day ranges) with plausible JSON whose
+size grows with the number of days. Latency, truncation and errors are
+configurable and drawn from a seeded generator, so runs are repeatable.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+import anthropic
+import httpx
+from geopy.exc import GeocoderUnavailable
+
+_FULL = re.compile(r"Create a detailed (\d+)-day travel itinerary for a student visiting (.+?)\.\n")
+_SKELETON = re.compile(r"Plan the outline of a (\d+)-day trip for a student visiting (.+?)\.\n")
+_DAY_RANGE = re.compile(r"days (\d+) to (\d+) of a (\d+)-day student trip to (.+?)\.\n")
+_BUDGET = re.compile(r"Budget: \$(\d+(?:\.\d+)?)")
+_DAILY_BUDGET = re.compile(r"Daily budget: \$(\d+(?:\.\d+)?)")
+
+_PLACES = ["Old Town", "City Museum", "Central Market", "Botanical Garden", "Cathedral", "River Walk",
+           "Street Art District", "University Quarter", "Castle", "Harbour", "Viewpoint", "Food Hall"]
+_ACTIVITIES = ["Walking tour of the {}", "Visit the {}", "Picnic near the {}", "Free entry afternoon at the {}",
+               "Photo walk around the {}", "Student discount tour of the {}"]
+_TIMES = ["8:30 AM", "10:00 AM", "12:30 PM", "3:00 PM", "6:00 PM", "8:00 PM"]
+
+
+def _rng(*parts):
+    return random.Random(hashlib.sha256("|".join(map(str, parts)).encode("utf-8")).hexdigest())
+
+
+def fake_day(destination, number, daily_budget, seed=0):
+    """One itinerary day with a deterministic mix of activities"""
+    rng = _rng(seed, destination, number)
+    activities = []
+    for time_slot in rng.sample(_TIMES, 4):
+        place = rng.choice(_PLACES)
+        activities.append({
+            "time": time_slot,
+            "activity": rng.choice(_ACTIVITIES).format(place),
+            "cost": rng.choice([0, 0, 5, 8, 12, 15, 20]),
+            "tips": f"Go early to avoid the queues at the {place} in {destination}"
+        })
+    activities.sort(key=lambda a: _TIMES.index(a["time"]))
+    return {
+        "day": number,
+        "title": f"Day {number}: {rng.choice(_PLACES)} and surroundings",
+        "activities": activities,
+        "meals": {
+            "breakfast": f"Bakery near the hostel (${rng.randint(3, 7)})",
+            "lunch": f"Market stalls (${rng.randint(6, 12)})",
+            "dinner": f"Family-run restaurant (${rng.randint(10, 20)})"
+        },
+        "accommodation": f"Hostel dorm bed (${round(daily_budget * 0.3)}/night)",
+        "daily_cost": round(daily_budget, 2)
+    }
+
+
+def _summary(destination, days, budget):
+    return {
+        "overview": f"A {days}-day student trip to {destination} balancing free sights with cheap local food",
+        "total_estimated_cost": budget,
+        "daily_budget": round(budget / days, 2),
+        "budget_breakdown": {
+            "accommodation": round(budget * 0.35),
+            "food": round(budget * 0.30),
+            "activities": round(budget * 0.20),
+            "transportation": round(budget * 0.15)
+        },
+        "money_saving_tips": ["Buy a multi-day transit pass", "Carry a student card", "Cook breakfast at the hostel"],
+        "accommodation_options": [
+            {"name": f"{destination} Central Hostel", "type": "Hostel", "price_per_night": 25, "tips": "Book early"},
+            {"name": f"{destination} Budget Inn", "type": "Guesthouse", "price_per_night": 45, "tips": "Ask for weekly rates"}
+        ],
+        "transportation": {
+            "getting_there": "Overnight bus or budget airline",
+            "local_transport": "Metro and walking",
+            "estimated_cost": round(budget * 0.15)
+        },
+        "essential_info": {
+            "best_time_to_visit": "Spring or autumn",
+            "currency": "Local currency, cards widely accepted",
+            "language": "Learn a few basic phrases",
+            "safety_tips": ["Watch for pickpockets in crowded areas", "Keep a copy of your passport"]
+        }
+    }
+
+
+def fake_model_text(prompt, seed=0):
+    """Answer an itinerary, skeleton or day-range prompt the way the model would, inside a markdown fence"""
+    budget_match = _BUDGET.search(prompt)
+    budget = float(budget_match.group(1)) if budget_match else 1000.0
+
+    match = _DAY_RANGE.search(prompt)
+    if match:
+        first, last, total, destination = int(match.group(1)), int(match.group(2)), int(match.group(3)), match.group(4)
+        daily_match = _DAILY_BUDGET.search(prompt)
+        daily = float(daily_match.group(1)) if daily_match else budget / total
+        data = {"days": [fake_day(destination, n, daily, seed) for n in range(first, last + 1)]}
+    elif _SKELETON.search(prompt):
+        match = _SKELETON.search(prompt)
+        days, destination = int(match.group(1)), match.group(2)
+        data = _summary(destination, days, budget)
+        data["day_themes"] = [{"day": n, "theme": f"Neighbourhood {n} on foot"} for n in range(1, days + 1)]
+    else:
+        match = _FULL.search(prompt)
+        days, destination = (int(match.group(1)), match.group(2)) if match else (3, "Somewhere")
+        data = dict({"destination": destination}, **_summary(destination, days, budget))
+        data["days"] = [fake_day(destination, n, budget / days, seed) for n in range(1, days + 1)]
+
+    return "```json\n" + json.dumps(data, indent=2) + "\n```"
+
+
+def _rate_limit_error():
+    request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+    response = httpx.Response(429, request=request, headers={"retry-after": "0"})
+    return anthropic.RateLimitError("Fake rate limit", response=response, body=None)
+
+
+class FakeAnthropic:
+    """
+    Drop-in for anthropic.Anthropic with messages.create and messages.stream.
+
+    latency is the time to the first token, token_latency the time per output
+    token (about four characters). truncate_rate and error_rate are the
+    probabilities that a response is cut short or that the call fails with
+    error ("rate_limit" or "connection").
+    """
+
+    def __init__(self, latency=0.0, token_latency=0.0, truncate_rate=0.0, error_rate=0.0,
+                 error="rate_limit", seed=0, stream_chunk_chars=40):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.truncate_rate = truncate_rate
+        self.error_rate = error_rate
+        self.error = error
+        self.seed = seed
+        self.stream_chunk_chars = stream_chunk_chars
+        self.calls = 0
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self.messages = _FakeMessages(self)
+
+    def _respond(self, messages):
+        prompt = messages[-1]["content"]
+        with self._lock:
+            self.calls += 1
+            attempt = self._attempts.get(prompt, 0)
+            self._attempts[prompt] = attempt + 1
+        rng = _rng(self.seed, prompt, attempt)
+
+        if rng.random() < self.error_rate:
+            time.sleep(self.latency)
+            if self.error == "connection":
+                raise anthropic.APIConnectionError(request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+            raise _rate_limit_error()
+
+        text = fake_model_text(prompt, self.seed)
+        stop_reason = "end_turn"
+        if rng.random() < self.truncate_rate:
+            text = text[:int(len(text) * rng.uniform(0.4, 0.95))]
+            stop_reason = "max_tokens"
+        usage = SimpleNamespace(input_tokens=len(prompt) // 4, output_tokens=len(text) // 4)
+        return text, stop_reason, usage
+
+
+class _FakeMessages:
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, model=None, max_tokens=None, messages=None, **kwargs):
+        client = self._client
+        text, stop_reason, usage = client._respond(messages)
+        time.sleep(client.latency + usage.output_tokens * client.token_latency)
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)], stop_reason=stop_reason,
+                               usage=usage, model=model)
+
+    def stream(self, model=None, max_tokens=None, messages=None, **kwargs):
+        text, stop_reason, usage = self._client._respond(messages)
+        return _FakeStream(self._client, text, stop_reason, usage, model)
+
+
+class _FakeStream:
+    def __init__(self, client, text, stop_reason, usage, model):
+        self._client = client
+        self._message = SimpleNamespace(content=[SimpleNamespace(type="text", text=text)],
+                                        stop_reason=stop_reason, usage=usage, model=model)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        client = self._client
+        text = self._message.content[0].text
+        time.sleep(client.latency)
+        for start in range(0, len(text), client.stream_chunk_chars):
+            chunk = text[start:start + client.stream_chunk_chars]
+            if client.token_latency:
+                time.sleep(len(chunk) / 4 * client.token_latency)
+            yield chunk
+
+    def get_final_message(self):
+        return self._message
+
+
+def fake_coordinates(query):
+    """Stable pseudo-coordinates for a place name"""
+    digest = hashlib.sha256(" ".join(str(query).split()).casefold().encode("utf-8")).digest()
+    lat = int.from_bytes(digest[:4], "big") / 2 ** 32 * 120 - 60
+    lon = int.from_bytes(digest[4:8], "big") / 2 ** 32 * 360 - 180
+    return round(lat, 6), round(lon, 6)
+
+
+class FakeNominatim:
+    """Drop-in for geopy's Nominatim with configurable latency, misses and errors"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, not_found_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.not_found_rate = not_found_rate
+        self.seed = seed
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def geocode(self, query, **kwargs):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        rng = _rng(self.seed, query, call)
+        time.sleep(self.latency)
+        if rng.random() < self.error_rate:
+            raise GeocoderUnavailable("Fake geocoder unavailable")
+        if rng.random() < self.not_found_rate:
+            return None
+        lat, lon = fake_coordinates(query)
+        return SimpleNamespace(latitude=lat, longitude=lon, address=str(query), raw={})
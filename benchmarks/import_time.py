@@ -0,0 +1,102 @@
+"""
+Report how long app.py's imports take, module by module.
+
+Usage:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --top 40 --output import_time.json
+    python -m benchmarks.import_time --max-ms 1500
+
+The modules app.py imports at the top level are loaded in a fresh
+interpreter under `python -X importtime`, which is what a new worker pays
+before it can serve its first page. The report lists the slowest modules by
+their own (self) and total (cumulative) time. With --max-ms the script exits
+non-zero when the whole import takes longer, so startup regressions fail CI.
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def app_imports(path=APP_PATH):
+    """Top-level modules imported by a script, in order"""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        modules.extend(name for name in names if name not in modules)
+    return modules
+
+
+def measure(modules):
+    """Import modules in a fresh interpreter; returns [{module, self_ms, cumulative_ms, depth}]"""
+    code = "\n".join(f"import {module}" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing the app failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            entries.append({
+                "module": match.group(4),
+                "self_ms": int(match.group(1)) / 1000,
+                "cumulative_ms": int(match.group(2)) / 1000,
+                "depth": len(match.group(3)) // 2
+            })
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-module import time of app.py")
+    parser.add_argument("--top", type=int, default=25, help="Modules to list")
+    parser.add_argument("--sort", choices=["self", "cumulative"], default="cumulative")
+    parser.add_argument("--max-ms", type=float, help="Fail when the whole import takes longer than this")
+    parser.add_argument("--output", help="Write the full report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    modules = app_imports()
+    entries = measure(modules)
+    # Modules imported directly by app.py sit at depth 0; their cumulative times add up to the total
+    total_ms = sum(entry["cumulative_ms"] for entry in entries if entry["depth"] == 0)
+
+    key = f"{args.sort}_ms"
+    print(f"{'module':<50} {'self ms':>9} {'total ms':>9}")
+    for entry in sorted(entries, key=lambda e: e[key], reverse=True)[:args.top]:
+        print(f"{entry['module']:<50} {entry['self_ms']:>9.1f} {entry['cumulative_ms']:>9.1f}")
+    print(f"\n{len(entries)} modules imported in {total_ms:.0f} ms")
+
+    print("\nBy app.py import:")
+    for entry in entries:
+        if entry["depth"] == 0 and entry["module"] in modules:
+            print(f"  {entry['module']:<48} {entry['cumulative_ms']:>9.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"imports": modules, "total_ms": round(total_ms, 1), "modules": entries}, f, indent=2)
+        print(f"Report written to {args.output}")
+
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print(f"Import time {total_ms:.0f} ms is over the {args.max_ms:.0f} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+Drive many concurrent simulated sessions through app.py against local fake
+Anthropic and Nominatim servers, and sweep concurrency to find where a
+worker saturates.
+
+Usage:
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --concurrency 1 4 16 32 --sessions 32 --latency 2 --token-latency 0.002
+    python -m benchmarks.load_test --shared-trip --output load.json
+
+Each session runs the real app script through Streamlit's AppTest: it opens
+the page, fills in the sidebar, clicks Generate, renders every day and
+requests the PDF. Per level the report has throughput, p50/p95/p99 latency
+per stage, and resident memory per live session. The saturation point is the
+last level whose throughput was at least --gain above the level before it.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config  # noqa: E402
+from benchmarks.fake_servers import start_fake_anthropic, start_fake_nominatim  # noqa: E402
+from streamlit.runtime import Runtime  # noqa: E402
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager  # noqa: E402
+from streamlit.runtime.media_file_manager import MediaFileManager  # noqa: E402
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage  # noqa: E402
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache  # noqa: E402
+from streamlit.testing.v1 import AppTest, app_test, local_script_runner  # noqa: E402
+from utils import map_helper  # noqa: E402
+
+APP_PATH = os.path.join(ROOT, "app.py")
+STAGES = ["open", "generate", "pdf", "session"]
+
+
+def _rss_bytes():
+    """Current resident set size; falls back to the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _SharedRuntime(Runtime):
+    """Takes AppTest's per-run runtime swaps, so concurrent runs don't tear down each other's runtime"""
+    _instance = None
+
+
+def _install_shared_runtime():
+    """
+    Make AppTest safe to run from many threads at once.
+
+    AppTest expects one run at a time. Every run installs a fresh mock runtime
+    and clears the pages cache, then restores both afterwards, so overlapping
+    runs break each other. Those swaps are redirected to stand-ins and a single
+    runtime is shared instead, which also makes st.cache_data process-wide.
+    Every run would also recompile app.py, and parallel compiles fail on some
+    Python versions, so all runs share one script cache. A real server shares
+    both of these the same way.
+    """
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    app_test.Runtime = _SharedRuntime
+    app_test.source_util = SimpleNamespace(_pages_cache_lock=threading.Lock(), _cached_pages=None)
+    script_cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: script_cache
+
+
+def _configure(args):
+    anthropic_server = start_fake_anthropic(latency=args.latency, token_latency=args.token_latency,
+                                            truncate_rate=args.truncate_rate, error_rate=args.error_rate,
+                                            seed=args.seed)
+    nominatim_server = start_fake_nominatim(latency=args.geocode_latency, seed=args.seed)
+
+    config.ANTHROPIC_API_KEY = "load-test-fake-key"
+    config.ANTHROPIC_BASE_URL = f"http://127.0.0.1:{anthropic_server.server_port}"
+    config.NOMINATIM_DOMAIN = f"127.0.0.1:{nominatim_server.server_port}"
+    config.NOMINATIM_SCHEME = "http"
+    # The fake has no usage policy, so lookups aren't spaced out
+    map_helper.geocode_resolver.min_interval = 0
+    config.CACHE_DB_PATH = os.path.join(tempfile.mkdtemp(prefix="travel_planner_load_"), "cache.sqlite3")
+    config.REQUEST_LOG_ENABLED = False
+    config.METRICS_LOG_PATH = None
+    config.METRICS_PROM_PATH = None
+    _install_shared_runtime()
+    return anthropic_server, nominatim_server
+
+
+def run_session(index, args):
+    """One user: open the page, generate a trip, render it and export the PDF; returns (timings, app)"""
+    timings = {}
+    destination = "Loadtown" if args.shared_trip else f"Loadtown {index}"
+    started = time.perf_counter()
+
+    at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    start = time.perf_counter()
+    at.run()
+    timings["open"] = time.perf_counter() - start
+
+    at.text_input[0].input(destination)
+    at.slider[0].set_value(args.days)
+    generate = next(b for b in at.button if "Generate" in b.label)
+    start = time.perf_counter()
+    generate.click()
+    at.run()
+    timings["generate"] = time.perf_counter() - start
+
+    if at.exception:
+        raise RuntimeError(f"Session {index} failed: {at.exception[0].value}")
+    # Days are rendered as expanders; make sure the whole trip came through
+    if len(at.get("expandable")) < args.days:
+        shown = "; ".join(element.value for element in list(at.error) + list(at.warning) + list(at.info))
+        raise RuntimeError(f"Session {index} rendered {len(at.get('expandable'))} of {args.days} days: {shown}")
+
+    pdf = next(b for b in at.button if "PDF" in b.label)
+    start = time.perf_counter()
+    pdf.click()
+    at.run()
+    timings["pdf"] = time.perf_counter() - start
+
+    timings["session"] = time.perf_counter() - started
+    return timings, at
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_level(concurrency, sessions, args, offset):
+    """Run sessions users with at most concurrency in flight; returns the level's summary"""
+    rss_before = _rss_bytes()
+    samples = {stage: [] for stage in STAGES}
+    errors = []
+    live_apps = []
+    lock = threading.Lock()
+
+    def worker(index):
+        try:
+            timings, at = run_session(offset + index, args)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        with lock:
+            for stage, seconds in timings.items():
+                samples[stage].append(seconds)
+            # Held until the level ends so memory is measured with every session alive
+            live_apps.append(at)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(sessions)))
+    elapsed = time.perf_counter() - start
+    rss_after = _rss_bytes()
+
+    completed = len(samples["session"])
+    summary = {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "completed": completed,
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "seconds": round(elapsed, 3),
+        "throughput_per_minute": round(completed / elapsed * 60, 2) if elapsed else 0,
+        "memory_per_session_mb": round(max(0, rss_after - rss_before) / max(completed, 1) / 2 ** 20, 2),
+        "rss_mb": round(rss_after / 2 ** 20, 1),
+        "stages": {}
+    }
+    for stage, values in samples.items():
+        if values:
+            summary["stages"][stage] = {
+                "p50_ms": round(_percentile(values, 0.50) * 1000, 1),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 1),
+                "p99_ms": round(_percentile(values, 0.99) * 1000, 1),
+                "mean_ms": round(statistics.fmean(values) * 1000, 1)
+            }
+    live_apps.clear()
+    return summary
+
+
+def saturation_point(levels, gain):
+    """Last concurrency level whose throughput improved on the previous one by more than gain"""
+    best = None
+    for previous, level in zip([None] + levels[:-1], levels):
+        if previous is None or level["throughput_per_minute"] > previous["throughput_per_minute"] * (1 + gain):
+            best = level["concurrency"]
+        else:
+            break
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test app.py with simulated concurrent sessions")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Levels to sweep")
+    parser.add_argument("--sessions", type=int, default=16, help="Sessions per level (at least the level)")
+    parser.add_argument("--days", type=int, default=5, help="Trip length every session asks for")
+    parser.add_argument("--shared-trip", action="store_true",
+                        help="Every session requests the same trip, exercising caching and coalescing")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake model time to first token, seconds")
+    parser.add_argument("--token-latency", type=float, default=0.0005, help="Fake model seconds per output token")
+    parser.add_argument("--truncate-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--geocode-latency", type=float, default=0.05, help="Fake Nominatim latency, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds one app run may take")
+    parser.add_argument("--gain", type=float, default=0.10, help="Throughput gain that still counts as scaling")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    _configure(args)
+    levels = []
+    offset = 0
+    for concurrency in args.concurrency:
+        sessions = max(args.sessions, concurrency)
+        level = run_level(concurrency, sessions, args, offset)
+        offset += sessions
+        levels.append(level)
+        stages = "  ".join(f"{stage} p95 {level['stages'][stage]['p95_ms']:.0f}ms"
+                           for stage in STAGES if stage in level["stages"])
+        print(f"concurrency {concurrency:>3}: {level['throughput_per_minute']:>8.1f} sessions/min  "
+              f"{level['errors']} errors  {level['memory_per_session_mb']:.1f} MB/session  {stages}")
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "settings": {k: v for k, v in vars(args).items() if k != "output"},
+        "llm_max_concurrent_calls": config.LLM_MAX_CONCURRENT_CALLS,
+        "levels": levels,
+        "saturation_concurrency": saturation_point(levels, args.gain)
+    }
+    print(f"Throughput stops scaling beyond {report['saturation_concurrency']} concurrent sessions")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    return 1 if any(level["errors"] for level in levels) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
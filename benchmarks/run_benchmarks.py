@@ -0,0 +1,244 @@
+"""
+Benchmark itinerary parsing, generation, maps and PDFs against local fakes.
+
+Usage:
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --days 1 5 14 30 --repeat 10
+    python -m benchmarks.run_benchmarks --latency 0.05 --truncate-rate 0.2 --error-rate 0.1
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/abc1234.json
+
+No network access or API key is needed: the Anthropic client and the
+Nominatim geocoder are replaced by the deterministic fakes in
+benchmarks/fakes.py, and the disk cache is disabled so every run does the
+full work. Results are written as JSON to benchmarks/results/<commit>.json
+(or --output). --compare prints the change against an earlier results file
+and, with --fail-on-regression, exits non-zero when a benchmark got slower
+than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config  # noqa: E402
+from benchmarks.fakes import FakeAnthropic, FakeNominatim, fake_coordinates, fake_model_text  # noqa: E402
+from utils import ai_helper, map_helper, metrics  # noqa: E402
+from utils.ai_helper import _build_prompt, _parse_response, generate_itinerary, generate_template_itinerary  # noqa: E402
+from utils.map_helper import create_travel_map, get_travel_map_html, itinerary_places  # noqa: E402
+from utils.pdf_generator import generate_itinerary_pdf  # noqa: E402
+from utils.routing import optimize_itinerary  # noqa: E402
+
+DEFAULT_DAYS = [1, 3, 5, 7, 10, 14, 21, 30]
+DESTINATION = "Benchmark City"
+TRIP = dict(budget=1500, travel_style="City Exploration", interests="museums, street food", start_date="2026-06-01")
+
+
+def _configure(args):
+    """Point the app at the fakes and turn off everything that would make runs depend on earlier ones"""
+    config.ANTHROPIC_API_KEY = "benchmark-fake-key"
+    config.CACHE_ENABLED = False
+    config.NEAR_MATCH_ENABLED = False
+    config.REQUEST_LOG_ENABLED = False
+    config.METRICS_LOG_PATH = None
+    config.METRICS_PROM_PATH = None
+    config.RATE_LIMIT_BASE_DELAY = 0.0
+
+    fake_client = FakeAnthropic(latency=args.latency, token_latency=args.token_latency,
+                                truncate_rate=args.truncate_rate, error_rate=args.error_rate,
+                                error=args.error, seed=args.seed)
+    ai_helper._client = fake_client
+    map_helper._geolocator = FakeNominatim(latency=args.geocode_latency, error_rate=args.geocode_error_rate,
+                                           seed=args.seed)
+    # The fake has no usage policy, so lookups aren't spaced out
+    map_helper.geocode_resolver.min_interval = 0
+    return fake_client
+
+
+def _fresh_geocode():
+    # Each map run should pay for its geocoder lookups, as a first request would
+    map_helper._memory_cache.clear()
+    map_helper._map_html_cache.clear()
+
+
+def benchmark_cases(days):
+    """Return {name: (setup, run)}; setup builds the input outside the timed region"""
+    prompt = _build_prompt(DESTINATION, days, **TRIP)
+    model_text = fake_model_text(prompt)
+    itinerary = _parse_response(model_text, DESTINATION)[0]
+    coordinates = {place["query"]: fake_coordinates(place["query"]) for place in itinerary_places(DESTINATION, itinerary)}
+
+    def parse():
+        return _parse_response(model_text, DESTINATION)
+
+    def generate():
+        return generate_itinerary(DESTINATION, days, **TRIP)
+
+    def template():
+        return generate_template_itinerary(DESTINATION, days, TRIP["budget"], TRIP["travel_style"], TRIP["interests"])
+
+    def travel_map():
+        return create_travel_map(DESTINATION, itinerary)
+
+    def map_html():
+        return get_travel_map_html(DESTINATION, itinerary)
+
+    def pdf():
+        return generate_itinerary_pdf(itinerary)
+
+    def routes():
+        return optimize_itinerary(itinerary, coordinates)
+
+    return {
+        "parse_response": (None, parse),
+        "generate_itinerary": (None, generate),
+        "generate_template_itinerary": (None, template),
+        "create_travel_map": (_fresh_geocode, travel_map),
+        "render_map_html": (_fresh_geocode, map_html),
+        "generate_itinerary_pdf": (None, pdf),
+        "optimize_routes": (None, routes)
+    }
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def time_case(setup, run, repeat, warmup):
+    samples = []
+    for iteration in range(warmup + repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        if iteration >= warmup:
+            samples.append(elapsed * 1000)
+    return {
+        "runs": repeat,
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p95_ms": round(_percentile(samples, 0.95), 3),
+        "max_ms": round(max(samples), 3)
+    }
+
+
+def _fallbacks():
+    counters, _ = metrics.snapshot()
+    return sum(value for (name, _), value in counters.items() if name == "template_fallbacks")
+
+
+def run(args):
+    fake_client = _configure(args)
+    results = []
+    selected = set(args.benchmarks or [])
+
+    for days in args.days:
+        for name, (setup, case) in benchmark_cases(days).items():
+            if selected and name not in selected:
+                continue
+            calls_before, fallbacks_before = fake_client.calls, _fallbacks()
+            result = dict(benchmark=name, days=days, **time_case(setup, case, args.repeat, args.warmup))
+            if name == "generate_itinerary":
+                result["model_calls"] = fake_client.calls - calls_before
+                result["template_fallbacks"] = _fallbacks() - fallbacks_before
+            results.append(result)
+            print(f"{name:<28} {days:>3}d  median {result['median_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms")
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "latency": args.latency,
+            "token_latency": args.token_latency,
+            "truncate_rate": args.truncate_rate,
+            "error_rate": args.error_rate,
+            "error": args.error,
+            "geocode_latency": args.geocode_latency,
+            "geocode_error_rate": args.geocode_error_rate,
+            "chunk_days": config.CHUNK_DAYS
+        },
+        "results": results
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(baseline, current, threshold):
+    """Print the median change per benchmark and return the ones slower than threshold"""
+    previous = {(r["benchmark"], r["days"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit', '?')} ({baseline.get('timestamp', '?')}):")
+    for result in current["results"]:
+        before = previous.get((result["benchmark"], result["days"]))
+        if not before or not before["median_ms"]:
+            continue
+        change = result["median_ms"] / before["median_ms"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(result)
+        print(f"{result['benchmark']:<28} {result['days']:>3}d  {before['median_ms']:>9.2f} -> "
+              f"{result['median_ms']:>9.2f} ms  {change:+.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the planner against local fakes")
+    parser.add_argument("--days", type=int, nargs="+", default=DEFAULT_DAYS, help="Trip lengths to benchmark")
+    parser.add_argument("--benchmarks", nargs="+", default=None, help="Only run these benchmarks")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs before timing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake model time to first token, seconds")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Fake model seconds per output token")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Share of responses cut short")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of model calls that fail")
+    parser.add_argument("--error", choices=["rate_limit", "connection"], default="rate_limit")
+    parser.add_argument("--geocode-latency", type=float, default=0.0, help="Fake Nominatim latency, seconds")
+    parser.add_argument("--geocode-error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Results file; defaults to benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown that counts as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
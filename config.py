@@ -29,10 +29,91 @@ TRAVEL_STYLES = [
     "Budget Backpacking"
 ]
 
+# Geocoding
+NOMINATIM_DOMAIN = "nominatim.openstreetmap.org"
+NOMINATIM_SCHEME = "https"
+GEOCODE_MIN_INTERVAL = 1.0  # seconds between Nominatim lookups, per its usage policy
+GEOCODE_WAIT_TIMEOUT = 120  # seconds a complete map waits for its places to be located
+GEOCODE_MISS_TTL = 7 * 24 * 60 * 60  # seconds a place Nominatim didn't find is not looked up again
+GEOCODE_ERROR_TTL = 5 * 60  # seconds a lookup that failed (timeout, HTTP error) waits before it is retried
+MAP_REFRESH_INTERVAL = 2  # seconds between map redraws while places are still being located
+
 # Default Map Settings
 DEFAULT_MAP_ZOOM = 6
 MAP_TILE = "OpenStreetMap"
 
 # PDF Export Settings
 PDF_TITLE = "Student Travel Itinerary"
-PDF_AUTHOR = "AI Travel Planner"
\ No newline at end of file
+PDF_AUTHOR = "AI Travel Planner"
+
+# Cache Settings
+CACHE_ENABLED = True
+CACHE_DB_PATH = ".cache/travel_planner.sqlite3"
+CACHE_MMAP_BYTES = 256 * 1024 * 1024
+CACHE_TOUCH_INTERVAL = 60  # seconds; hits refresh an entry's LRU position at most this often
+ITINERARY_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+ITINERARY_CACHE_MAX_ENTRIES = 5000
+GEOCODE_MEMORY_CACHE_SIZE = 1024
+GEOCODE_CACHE_MAX_ENTRIES = 50000
+GAZETTEER_PATH = "data/cities.csv"
+PDF_CACHE_TTL = 24 * 60 * 60  # seconds; the PDF footer carries the generation date
+PDF_CACHE_MAX_BYTES = 512 * 1024 * 1024
+PDF_MEMORY_CACHE_ITEMS = 256
+PDF_MEMORY_CACHE_BYTES = 64 * 1024 * 1024
+MAP_HTML_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+MAP_HTML_CACHE_MAX_BYTES = 256 * 1024 * 1024
+MAP_HTML_MEMORY_CACHE_ITEMS = 256
+
+# Near-Match Reuse
+# Requests close to a cached itinerary (same destination, style and budget band) reuse it, rescaled
+NEAR_MATCH_ENABLED = True
+NEAR_MATCH_MAX_DAY_DIFF = 2
+NEAR_MATCH_MAX_BUDGET_DIFF = 0.25  # fraction of the requested budget
+NEAR_MATCH_MIN_INTEREST_OVERLAP = 0.5  # Jaccard similarity of the interest lists
+NEAR_MATCH_BUCKET_SIZE = 50
+
+# Cache Warming
+REQUEST_LOG_ENABLED = True
+REQUEST_LOG_PATH = ".cache/requests.jsonl"
+REQUEST_LOG_MAX_BYTES = 20 * 1024 * 1024  # past this the log moves to <path>.1, replacing the older one
+WARM_DURATIONS = [5, 3, 7]  # most common first
+WARM_BUDGET = 1000  # the app's default budget
+WARM_LEAD_DAYS = 30  # warmed trips start this far ahead, like the app's default start date
+WARM_LOG_WINDOW_DAYS = 14
+WARM_TOP_REQUESTS = 200
+WARM_LLM_CALL_BUDGET = 100  # model calls per warming run
+WARM_OFF_PEAK_HOURS = (2, 6)  # local hours [start, end)
+
+# Metrics
+METRICS_ENABLED = True
+METRICS_LOG_PATH = ".cache/metrics.jsonl"  # structured per-stage log; None disables it
+METRICS_LOG_MAX_BYTES = 50 * 1024 * 1024  # past this the log moves to <path>.1, replacing the older one
+METRICS_PROM_PATH = ".cache/metrics.prom"  # Prometheus text file; None disables it
+METRICS_EXPORT_INTERVAL = 15  # seconds between rewrites of the Prometheus file
+METRICS_PORT = None  # set to serve /metrics over HTTP, e.g. 9108
+METRICS_DEBUG_PANEL = False  # show stage timings and counters in the sidebar
+
+# Long Trip Generation
+CHUNK_DAYS = 7  # trips longer than this are generated in day-range chunks
+MAX_PARALLEL_CHUNKS = 5
+
+# Anthropic Client Settings
+ANTHROPIC_BASE_URL = None  # None uses the SDK default; the load test points it at a local fake
+ANTHROPIC_MAX_CONNECTIONS = 20
+ANTHROPIC_MAX_RETRIES = 2
+ANTHROPIC_TIMEOUT = 120  # seconds
+RATE_LIMIT_MAX_ATTEMPTS = 5
+RATE_LIMIT_BASE_DELAY = 1.0  # seconds
+RATE_LIMIT_MAX_DELAY = 30.0  # seconds
+BATCH_CONCURRENCY = 8
+
+# LLM Admission Control
+LLM_MAX_CONCURRENT_CALLS = 8  # per process
+LLM_PER_SESSION_LIMIT = 5  # queued or running calls per session; long trips use up to MAX_PARALLEL_CHUNKS
+LLM_QUEUE_TIMEOUT = 120  # seconds a call may wait for a slot
+LLM_EXPECTED_CALL_SECONDS = 20.0  # initial estimate used for queue wait times
+
+# Shared Itinerary Store
+ITINERARY_STORE_MEMORY_ITEMS = 2000
+ITINERARY_STORE_MAX_ENTRIES = 20000  # on disk
+ITINERARY_STORE_SESSION_TTL = 2 * 60 * 60  # seconds before an idle session's reference expires
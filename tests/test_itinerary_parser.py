@@ -0,0 +1,97 @@
+import json
+from utils.itinerary_parser import IncrementalItineraryParser, extract_json
+
+ITINERARY = {
+    "destination": "Lisbon",
+    "overview": "Three days by the river",
+    "total_estimated_cost": 450,
+    "days": [
+        {"day": 1, "title": "Alfama", "activities": [{"time": "9:00 AM", "activity": "Castle", "cost": 10}]},
+        {"day": 2, "title": "Belém", "activities": [{"time": "10:00 AM", "activity": "Tower", "cost": 8}]}
+    ],
+    "money_saving_tips": ["Buy a transit pass"]
+}
+
+
+def test_valid_json_inside_markdown_fence():
+    text = "Here is your plan:\n```json\n" + json.dumps(ITINERARY) + "\n```\nEnjoy!"
+    assert extract_json(text) == (ITINERARY, [], False)
+
+
+def test_no_object():
+    assert extract_json("Sorry, I can't help with that.") == (None, [], False)
+
+
+def test_trailing_commas_are_removed():
+    data, repairs, truncated = extract_json('{"tips": ["a", "b",], "cost": 5,}')
+    assert data == {"tips": ["a", "b"], "cost": 5}
+    assert not truncated
+    assert repairs == ["removed 2 trailing comma(s)"]
+
+
+def test_unescaped_quotes_are_escaped():
+    data, repairs, _ = extract_json('{"activity": "Visit the "LX Factory" market", "cost": 0}')
+    assert data == {"activity": 'Visit the "LX Factory" market', "cost": 0}
+    assert repairs == ["escaped 2 unescaped quote(s)"]
+
+
+def test_raw_newlines_in_strings_are_escaped():
+    data, repairs, _ = extract_json('{"overview": "Line one\nLine two"}')
+    assert data == {"overview": "Line one\nLine two"}
+    assert repairs == ["escaped 1 raw control character(s) in strings"]
+
+
+def test_truncated_output_keeps_complete_days():
+    text = json.dumps(ITINERARY)
+    cut = text[:text.index('"Tower"')]
+    data, _, truncated = extract_json(cut)
+    assert truncated
+    assert data["total_estimated_cost"] == 450
+    assert [day["day"] for day in data["days"]] == [1]
+
+
+def test_truncated_inside_string_drops_the_value():
+    data, _, truncated = extract_json('{"destination": "Lisbon", "overview": "Three days by')
+    assert truncated
+    assert data == {"destination": "Lisbon"}
+
+
+def test_truncated_number_is_not_kept():
+    # "45" may be the start of 450
+    data, _, truncated = extract_json('{"destination": "Lisbon", "budget_breakdown": {"food": 45')
+    assert truncated
+    assert data == {"destination": "Lisbon"}
+
+    data, _, _ = extract_json('{"destination": "Lisbon", "total_estimated_cost": 12')
+    assert data == {"destination": "Lisbon"}
+
+
+def test_truncated_literal_is_not_kept():
+    data, _, _ = extract_json('{"destination": "Lisbon", "refundable": tr')
+    assert data == {"destination": "Lisbon"}
+
+
+def test_number_followed_by_whitespace_is_complete():
+    data, _, truncated = extract_json('{"destination": "Lisbon", "total_estimated_cost": 450 ')
+    assert truncated
+    assert data == {"destination": "Lisbon", "total_estimated_cost": 450}
+
+
+def test_incremental_parser_reports_days_and_sections_in_any_chunking():
+    text = "```json\n" + json.dumps(ITINERARY, indent=2) + "\n```"
+    for size in (1, 7, len(text)):
+        parser = IncrementalItineraryParser()
+        events = []
+        for start in range(0, len(text), size):
+            events += parser.feed(text[start:start + size])
+        assert [event[1]["day"] for event in events if event[0] == "day"] == [1, 2]
+        assert parser.sections == ITINERARY
+        assert parser.done
+
+
+def test_incremental_parser_only_reports_closed_days():
+    text = json.dumps(ITINERARY)
+    parser = IncrementalItineraryParser()
+    events = parser.feed(text[:text.index('"Tower"')])
+    assert [event[1]["day"] for event in events if event[0] == "day"] == [1]
+    assert "days" not in parser.sections
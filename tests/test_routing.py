@@ -0,0 +1,134 @@
+import itertools
+import random
+import numpy as np
+from utils import routing
+from utils.models import Activity, Day, Itinerary
+from utils.routing import distance_matrix, order_route, optimize_day, optimize_itinerary, route_length
+
+PARIS = (48.8566, 2.3522)
+LONDON = (51.5074, -0.1278)
+
+
+def _length(matrix, path):
+    return sum(matrix[a][b] for a, b in zip(path, path[1:]))
+
+
+def _best(matrix, start=None, end=None):
+    """Shortest path length by brute force, for checking small routes"""
+    size = len(matrix)
+    return min(
+        _length(matrix, path) for path in itertools.permutations(range(size))
+        if (start is None or path[0] == start) and (end is None or path[-1] == end)
+    )
+
+
+def _random_points(count, seed):
+    rng = random.Random(seed)
+    return [(48.8 + rng.random() * 0.1, 2.3 + rng.random() * 0.1) for _ in range(count)]
+
+
+def test_distance_matrix():
+    matrix = distance_matrix([PARIS, LONDON, PARIS])
+    assert matrix.shape == (3, 3)
+    assert np.allclose(matrix, matrix.T)
+    assert np.allclose(np.diag(matrix), 0)
+    assert 340 < matrix[0, 1] < 346
+
+
+def test_route_length():
+    assert route_length([]) == 0.0
+    assert route_length([PARIS]) == 0.0
+    assert route_length([PARIS, LONDON, PARIS]) == distance_matrix([PARIS, LONDON])[0, 1] * 2
+
+
+def test_tiny_routes():
+    assert order_route(np.zeros((0, 0))) == []
+    assert order_route(np.zeros((1, 1))) == [0]
+    assert order_route(distance_matrix([PARIS, LONDON]), start=1) == [1, 0]
+
+
+def test_small_routes_are_exact():
+    for seed in range(5):
+        matrix = distance_matrix(_random_points(7, seed))
+        for start, end in [(None, None), (0, None), (None, 6), (0, 6)]:
+            path = order_route(matrix, start=start, end=end)
+            assert sorted(path) == list(range(7))
+            if start is not None:
+                assert path[0] == start
+            if end is not None:
+                assert path[-1] == end
+            assert abs(_length(matrix, path) - _best(matrix, start, end)) < 1e-9
+
+
+def test_large_routes_visit_every_point_once_and_never_get_longer():
+    for seed in range(5):
+        matrix = distance_matrix(_random_points(25, seed))
+        path = order_route(matrix, start=0, end=24)
+        assert sorted(path) == list(range(25))
+        assert path[0] == 0 and path[-1] == 24
+        assert _length(matrix, path) <= _length(matrix, list(range(25))) + 1e-9
+
+
+def test_large_route_along_a_line_is_sorted():
+    order = list(range(20))
+    random.Random(1).shuffle(order)
+    points = [(48.0 + 0.01 * position, 2.0) for position in order]
+    path = order_route(distance_matrix(points))
+    positions = [order[idx] for idx in path]
+    assert positions in (sorted(positions), sorted(positions, reverse=True))
+
+
+def _day(activities, accommodation=""):
+    return Day(day=1, title="Day 1", activities=tuple(Activity(time, text) for time, text in activities),
+               accommodation=accommodation)
+
+
+def test_optimize_day_keeps_time_slots_and_meals_in_place():
+    day = _day([("9:00 AM", "Visit the East Gate"), ("11:00 AM", "Visit the West Gate"),
+                ("1:00 PM", "Lunch at the Central Market"), ("3:00 PM", "Visit the East Tower"),
+                ("5:00 PM", "Visit the West Tower")], accommodation="Stay at the West Hostel")
+    coordinates = {
+        "East Gate, Testville": (48.0, 2.30), "West Gate, Testville": (48.0, 2.10),
+        "Central Market, Testville": (48.0, 2.20), "East Tower, Testville": (48.0, 2.31),
+        "West Tower, Testville": (48.0, 2.11), "West Hostel, Testville": (48.0, 2.09)
+    }
+    optimized, before, after = optimize_day(day, coordinates, "Testville")
+    assert after < before
+    assert [a.time for a in optimized.activities] == [a.time for a in day.activities]
+    assert optimized.activities[2].activity == "Lunch at the Central Market"
+    assert [a.activity for a in optimized.activities[:2]] == ["Visit the West Gate", "Visit the East Gate"]
+    assert [a.activity for a in optimized.activities[3:]] == ["Visit the East Tower", "Visit the West Tower"]
+
+
+def test_optimize_day_leaves_a_good_order_alone():
+    day = _day([("9:00 AM", "Visit the First Hall"), ("11:00 AM", "Visit the Second Hall"),
+                ("2:00 PM", "Visit the Third Hall")])
+    coordinates = {"First Hall, Testville": (48.0, 2.0), "Second Hall, Testville": (48.0, 2.1),
+                   "Third Hall, Testville": (48.0, 2.2)}
+    optimized, before, after = optimize_day(day, coordinates, "Testville")
+    assert optimized is day
+    assert before == after
+
+
+def test_optimize_itinerary_report():
+    itinerary = Itinerary.from_dict({"destination": "Testville", "days": [
+        {"day": 1, "activities": [{"time": "9:00 AM", "activity": "Visit the North Pier"},
+                                  {"time": "11:00 AM", "activity": "Visit the South Pier"},
+                                  {"time": "2:00 PM", "activity": "Visit the North Dock"}]}
+    ]})
+    coordinates = {"North Pier, Testville": (48.2, 2.0), "South Pier, Testville": (48.0, 2.0),
+                   "North Dock, Testville": (48.21, 2.0)}
+    optimized, report = optimize_itinerary(itinerary, coordinates)
+    assert report["days"][0]["reordered"]
+    assert report["saved_km"] > 0
+    assert report["after_km"] < report["before_km"]
+    assert len(optimized.days[0].activities) == 3
+
+
+def test_order_cities(monkeypatch):
+    located = {"Paris": PARIS, "London": LONDON, "Lyon": (45.764, 4.8357), "Atlantis": (0, 0)}
+    monkeypatch.setattr(routing, "get_coordinates", lambda city: located[city])
+    cities, before, after = routing.order_cities(["Paris", "Lyon", "London", "Atlantis"])
+    # Cities that can't be located go last
+    assert cities == ["Paris", "London", "Lyon", "Atlantis"]
+    assert after < before
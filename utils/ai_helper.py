@@ -1,17 +1,105 @@
-import anthropic
+import asyncio
 import config
-import json
+import contextvars
+import copy
+import queue
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from utils import cache, metrics, near_match, singleflight
+from utils.itinerary_parser import IncrementalItineraryParser, extract_json
+from utils.models import Itinerary
+from utils.scheduler import current_session, llm_scheduler
 
-def generate_itinerary(destination, days, budget, travel_style, interests, start_date):
-    """Generate a personalized travel itinerary using Claude AI"""
+MODEL = "claude-sonnet-4-20250514"
+MAX_TOKENS = 4000
+SKELETON_MAX_TOKENS = 2000
+
+DAY_FORMAT = """{
+    "day": day_number,
+    "title": "Short title for the day",
+    "activities": [{"time": "9:00 AM", "activity": "...", "cost": cost, "tips": "..."}],
+    "meals": {"breakfast": "...", "lunch": "...", "dinner": "..."},
+    "accommodation": "...",
+    "daily_cost": daily_cost
+}"""
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """Return the process-wide Anthropic client, which keeps a pool of open connections"""
+    global _client
+    # The SDK and its models take a while to import; sessions that never call the model skip it
+    import anthropic
+    import httpx
     
-    if config.ANTHROPIC_API_KEY == "your-api-key-here":
-        return generate_template_itinerary(destination, days, budget, travel_style, interests)
+    with _client_lock:
+        if _client is None:
+            _client = anthropic.Anthropic(
+                api_key=config.ANTHROPIC_API_KEY,
+                base_url=config.ANTHROPIC_BASE_URL,
+                max_retries=config.ANTHROPIC_MAX_RETRIES,
+                http_client=httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=config.ANTHROPIC_MAX_CONNECTIONS,
+                        max_keepalive_connections=config.ANTHROPIC_MAX_CONNECTIONS
+                    ),
+                    timeout=config.ANTHROPIC_TIMEOUT
+                )
+            )
+        return _client
+
+
+def get_async_client():
+    """Return the pooled async Anthropic client for the running event loop"""
+    import anthropic
+    import httpx
     
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = anthropic.AsyncAnthropic(
+            api_key=config.ANTHROPIC_API_KEY,
+            base_url=config.ANTHROPIC_BASE_URL,
+            max_retries=config.ANTHROPIC_MAX_RETRIES,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=config.ANTHROPIC_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.ANTHROPIC_MAX_CONNECTIONS
+                ),
+                timeout=config.ANTHROPIC_TIMEOUT
+            )
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_client():
+    """Close the running event loop's async client, so no connections are left open when the loop ends"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+def _retry_delay(error, attempt):
+    """Seconds to wait before retrying a rate-limited call, honoring retry-after when present"""
     try:
-        client = anthropic.Anthropic(api_key=config.ANTHROPIC_API_KEY)
-        
-        prompt = f"""Create a detailed {days}-day travel itinerary for a student visiting {destination}.
+        retry_after = float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        retry_after = None
+    if retry_after is not None and retry_after >= 0:
+        return retry_after
+    delay = config.RATE_LIMIT_BASE_DELAY * (2 ** attempt)
+    return min(delay, config.RATE_LIMIT_MAX_DELAY) * random.uniform(0.5, 1.0)
+
+
+def _build_prompt(destination, days, budget, travel_style, interests, start_date):
+    return f"""Create a detailed {days}-day travel itinerary for a student visiting {destination}.
 
 Budget: ${budget} USD (total for the entire trip)
 Travel Style: {travel_style}
@@ -32,28 +120,604 @@ Please provide a comprehensive itinerary in JSON format with the following struc
 
 Focus on budget-friendly options suitable for students."""
 
-        message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=4000,
+
+def _timed_extract_json(response_text):
+    with metrics.span("parse_json") as span:
+        data, repairs, truncated = extract_json(response_text)
+        span["chars"] = len(response_text)
+        # Numeric, so it goes to the structured log with the span rather than into its labels
+        span["repairs"] = len(repairs)
+    if repairs:
+        metrics.incr("json_repairs")
+    if truncated:
+        metrics.incr("json_truncated")
+    return data, repairs, truncated
+
+
+def _extract_json(response_text):
+    """Parse the JSON object out of the model output, repairing it if needed"""
+    data, repairs, truncated = _timed_extract_json(response_text)
+    if data is None:
+        raise ValueError("No JSON object found in model output")
+    return data
+
+
+def _parse_response(response_text, destination):
+    """
+    Extract the itinerary JSON from the model output.
+    Returns (itinerary, cacheable); truncated or unparseable output is not cacheable.
+    """
+    data, repairs, truncated = _timed_extract_json(response_text)
+    if data is None:
+        # The raw text would become the overview shown to the user and the context of every day-range prompt
+        return {"destination": destination, "overview": f"A budget-friendly trip to {destination}", "days": []}, False
+    
+    data.setdefault("destination", destination)
+    return data, not truncated
+
+
+def _template_fallback(reason, destination, days, budget, travel_style, interests):
+    metrics.incr("template_fallbacks", reason=reason)
+    return generate_template_itinerary(destination, days, budget, travel_style, interests)
+
+
+def _record_usage(span, message):
+    """Attach the token counts of a model response to a span and the token counters"""
+    usage = getattr(message, "usage", None)
+    if usage is None:
+        return
+    span["input_tokens"] = usage.input_tokens
+    span["output_tokens"] = usage.output_tokens
+    metrics.incr("llm_tokens", usage.input_tokens, type="input")
+    metrics.incr("llm_tokens", usage.output_tokens, type="output")
+
+
+def _cached_itinerary(cache_key, destination, days, budget, travel_style, interests, start_date):
+    """Return the cached itinerary for a request, or one adapted from a close match, or None"""
+    cached = cache.get_json("itinerary", cache_key, ttl=config.ITINERARY_CACHE_TTL)
+    if cached is not None:
+        metrics.incr("itinerary_lookups", result="exact")
+        return cached
+    cached = near_match.find(destination, days, budget, travel_style, interests, start_date)
+    metrics.incr("itinerary_lookups", result="miss" if cached is None else "near_match")
+    return cached
+
+
+def get_cached_itinerary(destination, days, budget, travel_style, interests, start_date):
+    """Return a cached or near-match itinerary for a request without calling the model, or None"""
+    cache_key = cache.make_key(destination, days, budget, travel_style, interests, start_date)
+    return _cached_itinerary(cache_key, destination, days, budget, travel_style, interests, start_date)
+
+
+def _cache_itinerary(cache_key, itinerary, destination, days, budget, travel_style, interests, start_date):
+    cache.set_json("itinerary", cache_key, itinerary,
+                   max_entries=config.ITINERARY_CACHE_MAX_ENTRIES)
+    near_match.remember(cache_key, destination, days, budget, travel_style, interests, start_date)
+
+
+def _create_message(client, prompt, max_tokens=MAX_TOKENS):
+    import anthropic
+    
+    for attempt in range(config.RATE_LIMIT_MAX_ATTEMPTS):
+        try:
+            with llm_scheduler.slot(), metrics.span("llm_call") as span:
+                message = client.messages.create(
+                    model=MODEL,
+                    max_tokens=max_tokens,
+                    messages=[{"role": "user", "content": prompt}]
+                )
+                _record_usage(span, message)
+            return message.content[0].text
+        except anthropic.RateLimitError as e:
+            metrics.incr("llm_rate_limited")
+            if attempt == config.RATE_LIMIT_MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(_retry_delay(e, attempt))
+
+
+async def _acreate_message(client, prompt, max_tokens=MAX_TOKENS):
+    import anthropic
+    
+    for attempt in range(config.RATE_LIMIT_MAX_ATTEMPTS):
+        ticket = await llm_scheduler.aacquire(current_session.get())
+        try:
+            with metrics.span("llm_call") as span:
+                message = await client.messages.create(
+                    model=MODEL,
+                    max_tokens=max_tokens,
+                    messages=[{"role": "user", "content": prompt}]
+                )
+                _record_usage(span, message)
+            return message.content[0].text
+        except anthropic.RateLimitError as e:
+            metrics.incr("llm_rate_limited")
+            if attempt == config.RATE_LIMIT_MAX_ATTEMPTS - 1:
+                raise
+            delay = _retry_delay(e, attempt)
+        finally:
+            llm_scheduler.release(ticket)
+        await asyncio.sleep(delay)
+
+
+def _build_skeleton_prompt(destination, days, budget, travel_style, interests, start_date):
+    return f"""Plan the outline of a {days}-day trip for a student visiting {destination}.
+
+Budget: ${budget} USD (total for the entire trip)
+Travel Style: {travel_style}
+Interests: {interests}
+Start Date: {start_date}
+
+Do not plan individual days yet. Respond with compact JSON only:
+{{
+    "overview": "Brief overview of the trip",
+    "total_estimated_cost": estimated_cost,
+    "daily_budget": daily_budget,
+    "day_themes": [{{"day": 1, "theme": "One-line theme"}}, ...],
+    "budget_breakdown": {{...}},
+    "money_saving_tips": [...],
+    "essential_info": {{...}}
+}}
+
+Include exactly {days} day themes and focus on budget-friendly options suitable for students."""
+
+
+def _build_days_prompt(destination, first_day, last_day, total_days, travel_style, interests, start_date, skeleton, themes):
+    theme_lines = "\n".join(f"Day {day}: {themes.get(day, 'Free exploration')}" for day in range(first_day, last_day + 1))
+    return f"""You are planning days {first_day} to {last_day} of a {total_days}-day student trip to {destination}.
+
+Trip overview: {skeleton.get('overview', '')}
+Daily budget: ${skeleton.get('daily_budget', '')} USD
+Travel Style: {travel_style}
+Interests: {interests}
+Trip Start Date: {start_date}
+
+Themes for these days:
+{theme_lines}
+
+Respond with JSON only, in the form {{"days": [...]}}, where each day looks like:
+{DAY_FORMAT}
+
+Stay within the daily budget and focus on budget-friendly options suitable for students."""
+
+
+def _generate_day_range(client, destination, first_day, last_day, total_days, travel_style, interests, start_date, skeleton, themes):
+    prompt = _build_days_prompt(destination, first_day, last_day, total_days, travel_style,
+                                interests, start_date, skeleton, themes)
+    return _extract_json(_create_message(client, prompt)).get("days", [])
+
+
+def _complete_days(client, itinerary, response_text, cacheable, destination, days, budget, travel_style,
+                   interests, start_date, fallback=True):
+    """
+    Fill in the days missing from a short trip, e.g. when the model output was cut off.
+
+    The missing range is requested from the model like a chunk of a long trip
+    and whatever it can't supply comes from the template, or raises with
+    fallback=False. Returns (added_days, complete); complete is False when
+    template days were used.
+    """
+    planned = [day for day in itinerary.get("days") or [] if isinstance(day, dict)][:days]
+    if not cacheable and planned:
+        # Output cut off inside the days array may have left the last day half-written
+        parser = IncrementalItineraryParser()
+        events = parser.feed(response_text)
+        if "days" not in parser.sections:
+            planned = planned[:sum(event[0] == "day" for event in events)]
+    if len(planned) == days:
+        itinerary["days"] = planned
+        return [], True
+    
+    first = len(planned) + 1
+    try:
+        added = _generate_day_range(client, destination, first, days, days, travel_style, interests,
+                                    start_date, itinerary, {})
+        added = [day for day in added if isinstance(day, dict)][:days - len(planned)]
+    except Exception as e:
+        print(f"Error generating days {first}-{days}: {e}")
+        added = []
+    
+    complete = len(planned) + len(added) == days
+    if not complete:
+        if not fallback:
+            raise RuntimeError(f"Days {first + len(added)}-{days} could not be generated")
+        metrics.incr("template_fallbacks", reason="truncated")
+        template_days = generate_template_itinerary(destination, days, budget, travel_style, interests)["days"]
+        added += template_days[len(planned) + len(added):]
+    
+    for number, day in enumerate(added, start=first):
+        day["day"] = number
+    itinerary["days"] = planned + added
+    return added, complete
+
+
+def _iter_chunked_itinerary(client, cache_key, destination, days, budget, travel_style, interests, start_date,
+                            fallback=True):
+    """
+    Generate a long trip as a shared skeleton plus day-range chunks requested in parallel.
+
+    Yields the same events as generate_itinerary_stream. Chunks that fail are
+    filled in from the template itinerary, in which case the result is not cached;
+    with fallback=False they raise instead.
+    """
+    skeleton = _extract_json(_create_message(
+        client,
+        _build_skeleton_prompt(destination, days, budget, travel_style, interests, start_date),
+        max_tokens=SKELETON_MAX_TOKENS
+    ))
+    themes = {}
+    for theme in skeleton.pop("day_themes", []):
+        if isinstance(theme, dict):
+            themes[theme.get("day")] = theme.get("theme", "")
+    
+    skeleton.pop("days", None)
+    skeleton["destination"] = destination
+    for key, value in skeleton.items():
+        yield ("section", key, value)
+    
+    ranges = [(first, min(first + config.CHUNK_DAYS - 1, days)) for first in range(1, days + 1, config.CHUNK_DAYS)]
+    all_days = []
+    complete = True
+    
+    with ThreadPoolExecutor(max_workers=config.MAX_PARALLEL_CHUNKS) as executor:
+        futures = [
+            # Each chunk runs in a copy of the caller's context so it is scheduled for the same session
+            executor.submit(contextvars.copy_context().run, _generate_day_range, client, destination,
+                            first, last, days, travel_style, interests, start_date, skeleton, themes)
+            for first, last in ranges
+        ]
+        
+        # Days are emitted in trip order; later chunks usually finish while earlier ones are rendered
+        for (first, last), future in zip(ranges, futures):
+            expected = last - first + 1
+            try:
+                chunk_days = [day for day in future.result() if isinstance(day, dict)][:expected]
+            except Exception as e:
+                print(f"Error generating days {first}-{last}: {e}")
+                chunk_days = []
+            
+            if len(chunk_days) < expected:
+                if not fallback:
+                    raise RuntimeError(f"Days {first}-{last} could not be generated")
+                complete = False
+                metrics.incr("template_fallbacks", reason="chunk")
+                template_days = generate_template_itinerary(destination, days, budget, travel_style, interests)["days"]
+                chunk_days += template_days[first - 1 + len(chunk_days):last]
+            
+            for day in chunk_days:
+                day["day"] = len(all_days) + 1
+                all_days.append(day)
+                yield ("day", day)
+    
+    itinerary = dict(skeleton, days=all_days)
+    yield ("section", "days", all_days)
+    
+    if complete:
+        _cache_itinerary(cache_key, itinerary, destination, days, budget,
+                         travel_style, interests, start_date)
+    yield ("done", itinerary)
+
+
+def _generate_uncached(cache_key, destination, days, budget, travel_style, interests, start_date, fallback=True):
+    """Call the model for a request that is not cached, falling back to the template on errors"""
+    try:
+        client = get_client()
+        
+        if days > config.CHUNK_DAYS:
+            for event in _iter_chunked_itinerary(client, cache_key, destination, days, budget,
+                                                 travel_style, interests, start_date, fallback):
+                if event[0] == "done":
+                    return event[1]
+        
+        response_text = _create_message(client, _build_prompt(destination, days, budget, travel_style, interests, start_date))
+        itinerary, cacheable = _parse_response(response_text, destination)
+        if not fallback and not itinerary.get("days"):
+            raise ValueError("No itinerary days in model output")
+        added, complete = _complete_days(client, itinerary, response_text, cacheable, destination, days, budget,
+                                         travel_style, interests, start_date, fallback)
+        if cacheable and complete:
+            _cache_itinerary(cache_key, itinerary, destination, days, budget,
+                             travel_style, interests, start_date)
+        return itinerary
+            
+    except Exception as e:
+        print(f"Error generating itinerary: {e}")
+        if not fallback:
+            raise
+        return _template_fallback("error", destination, days, budget, travel_style, interests)
+
+
+def generate_itinerary(destination, days, budget, travel_style, interests, start_date, fallback=True):
+    """
+    Generate a personalized travel itinerary using Claude AI.
+
+    Errors fall back to the template itinerary; with fallback=False they are
+    raised instead, so callers that keep results can tell a failure apart.
+    """
+    
+    if config.ANTHROPIC_API_KEY == "your-api-key-here":
+        if not fallback:
+            raise RuntimeError("ANTHROPIC_API_KEY is not set")
+        return _template_fallback("no_api_key", destination, days, budget, travel_style, interests)
+    
+    cache_key = cache.make_key(destination, days, budget, travel_style, interests, start_date)
+    cached = _cached_itinerary(cache_key, destination, days, budget, travel_style, interests, start_date)
+    if cached is not None:
+        return cached
+    
+    def produce():
+        with singleflight.file_lock(cache_key):
+            # Another worker process may have finished this request while we waited for the lock
+            cached = cache.get_json("itinerary", cache_key, ttl=config.ITINERARY_CACHE_TTL)
+            if cached is not None:
+                return cached
+            return _generate_uncached(cache_key, destination, days, budget, travel_style, interests, start_date,
+                                      fallback)
+    
+    try:
+        # Identical concurrent requests share one generation; each caller gets its own copy
+        return copy.deepcopy(singleflight.do(cache_key, produce))
+    except Exception as e:
+        print(f"Error generating itinerary: {e}")
+        if not fallback:
+            raise
+        return _template_fallback("error", destination, days, budget, travel_style, interests)
+
+
+def _replay_itinerary(itinerary):
+    for key, value in itinerary.items():
+        if key == "days":
+            for day in value:
+                yield ("day", day)
+        yield ("section", key, value)
+    yield ("done", itinerary)
+
+
+def _read_stream(client, prompt, chunks):
+    """
+    Put the text of a streamed model response on the chunks queue, then None,
+    or the exception that ended it. The scheduler slot is held only while the
+    stream is read, however slowly the consumer takes the chunks.
+    """
+    try:
+        with llm_scheduler.slot(), metrics.span("llm_stream") as span, client.messages.stream(
+            model=MODEL,
+            max_tokens=MAX_TOKENS,
             messages=[{"role": "user", "content": prompt}]
-        )
+        ) as stream:
+            started = time.perf_counter()
+            first = True
+            for text in stream.text_stream:
+                if first:
+                    span["first_token_seconds"] = round(time.perf_counter() - started, 4)
+                    first = False
+                chunks.put(text)
+            _record_usage(span, stream.get_final_message())
+        chunks.put(None)
+    except Exception as e:
+        chunks.put(e)
+
+
+def _stream_uncached(cache_key, destination, days, budget, travel_style, interests, start_date):
+    try:
+        client = get_client()
+        
+        if days > config.CHUNK_DAYS:
+            yield from _iter_chunked_itinerary(client, cache_key, destination, days, budget,
+                                               travel_style, interests, start_date)
+            return
         
-        response_text = message.content[0].text
+        parser = IncrementalItineraryParser()
+        chunks = []
         
+        # The stream is read on its own thread, so days are yielded without holding a scheduler slot
+        received = queue.Queue()
+        prompt = _build_prompt(destination, days, budget, travel_style, interests, start_date)
+        threading.Thread(target=contextvars.copy_context().run, args=(_read_stream, client, prompt, received),
+                         daemon=True).start()
+        while True:
+            text = received.get()
+            if text is None:
+                break
+            if isinstance(text, Exception):
+                raise text
+            chunks.append(text)
+            yield from parser.feed(text)
+        
+        response_text = "".join(chunks)
+        itinerary, cacheable = _parse_response(response_text, destination)
+        added, complete = _complete_days(client, itinerary, response_text, cacheable, destination, days, budget,
+                                         travel_style, interests, start_date)
+        for day in added:
+            yield ("day", day)
+        if cacheable and complete:
+            _cache_itinerary(cache_key, itinerary, destination, days, budget,
+                             travel_style, interests, start_date)
+        yield ("done", itinerary)
+        
+    except Exception as e:
+        print(f"Error generating itinerary: {e}")
+        yield ("done", _template_fallback("error", destination, days, budget, travel_style, interests))
+
+
+def generate_itinerary_stream(destination, days, budget, travel_style, interests, start_date):
+    """
+    Generate an itinerary while streaming the model output.
+
+    Yields ("day", day) for each day and ("section", key, value) for each
+    top-level key as soon as it is complete, then ("done", itinerary) with the
+    final result. Cached and template itineraries are replayed the same way.
+    """
+    if config.ANTHROPIC_API_KEY == "your-api-key-here":
+        yield from _replay_itinerary(_template_fallback("no_api_key", destination, days, budget,
+                                                        travel_style, interests))
+        return
+    
+    cache_key = cache.make_key(destination, days, budget, travel_style, interests, start_date)
+    cached = _cached_itinerary(cache_key, destination, days, budget, travel_style, interests, start_date)
+    if cached is not None:
+        yield from _replay_itinerary(cached)
+        return
+    
+    call, leader = singleflight.acquire(cache_key)
+    if not leader:
+        # An identical request is already generating; wait for it instead of starting another
         try:
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0]
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0]
-            
-            itinerary = json.loads(response_text.strip())
-            return itinerary
-        except json.JSONDecodeError:
-            return {"destination": destination, "overview": response_text, "days": []}
+            itinerary = copy.deepcopy(call.wait())
+        except Exception as e:
+            print(f"Error generating itinerary: {e}")
+            itinerary = _template_fallback("error", destination, days, budget, travel_style, interests)
+        yield from _replay_itinerary(itinerary)
+        return
+    
+    itinerary = None
+    try:
+        with singleflight.file_lock(cache_key):
+            cached = cache.get_json("itinerary", cache_key, ttl=config.ITINERARY_CACHE_TTL)
+            if cached is not None:
+                itinerary = cached
+                yield from _replay_itinerary(cached)
+                return
             
+            for event in _stream_uncached(cache_key, destination, days, budget, travel_style, interests, start_date):
+                if event[0] == "done":
+                    itinerary = event[1]
+                yield event
+    finally:
+        if itinerary is not None:
+            call.resolve(copy.deepcopy(itinerary))
+        singleflight.release(cache_key, call)
+
+
+def _build_regenerate_prompt(itinerary, first_day, last_day, travel_style, interests, start_date, feedback):
+    kept_days = "\n".join(
+        f"Day {day['day']}: {day.get('title', '')}" for day in itinerary["days"]
+        if not first_day <= day["day"] <= last_day
+    )
+    replaced_days = "\n".join(
+        f"Day {day['day']}: {day.get('title', '')} (${day.get('daily_cost', 0)})" for day in itinerary["days"]
+        if first_day <= day["day"] <= last_day
+    )
+    return f"""You are revising days {first_day} to {last_day} of a {len(itinerary['days'])}-day student trip to {itinerary['destination']}.
+
+Trip overview: {itinerary.get('overview', '')}
+Daily budget: ${itinerary.get('daily_budget', '')} USD
+Travel Style: {travel_style}
+Interests: {interests}
+Trip Start Date: {start_date}
+
+The rest of the trip stays as planned, so don't repeat its activities:
+{kept_days or 'None'}
+
+The traveler wants these days replaced:
+{replaced_days}
+Requested changes: {feedback or 'Something different from the current plan'}
+
+Respond with JSON only, in the form {{"days": [...]}}, with exactly {last_day - first_day + 1} days, where each day looks like:
+{DAY_FORMAT}
+
+Stay within the daily budget and focus on budget-friendly options suitable for students."""
+
+
+def regenerate_days(itinerary, first_day, last_day, travel_style, interests, start_date, feedback=""):
+    """
+    Regenerate days first_day..last_day of an existing itinerary, keeping the
+    rest of the trip and its budget as context. Returns the merged itinerary
+    dict; days the model fails to return are left unchanged.
+    """
+    itinerary = Itinerary.coerce(itinerary).to_dict()
+    total_days = len(itinerary["days"])
+    first_day = max(1, first_day)
+    last_day = min(max((day["day"] for day in itinerary["days"]), default=0), last_day)
+    if first_day > last_day:
+        return itinerary
+    
+    if config.ANTHROPIC_API_KEY == "your-api-key-here":
+        budget = itinerary.get("total_estimated_cost") or itinerary.get("daily_budget", 0) * total_days
+        metrics.incr("template_fallbacks", reason="no_api_key")
+        new_days = generate_template_itinerary(itinerary["destination"], total_days, budget,
+                                               travel_style, interests)["days"][first_day - 1:last_day]
+    else:
+        try:
+            prompt = _build_regenerate_prompt(itinerary, first_day, last_day, travel_style,
+                                              interests, start_date, feedback)
+            new_days = _extract_json(_create_message(get_client(), prompt)).get("days", [])
+        except Exception as e:
+            print(f"Error regenerating days {first_day}-{last_day}: {e}")
+            new_days = []
+    
+    positions = {day["day"]: idx for idx, day in enumerate(itinerary["days"])}
+    new_days = [day for day in new_days if isinstance(day, dict)][:last_day - first_day + 1]
+    for offset, day in enumerate(new_days):
+        day["day"] = first_day + offset
+        if day["day"] in positions:
+            itinerary["days"][positions[day["day"]]] = day
+    
+    return itinerary
+
+
+async def agenerate_itinerary(destination, days, budget, travel_style, interests, start_date, fallback=True):
+    """
+    Async version of generate_itinerary using the pooled async client.
+
+    Long trips reuse the chunked planner, which already parallelizes its calls,
+    on a worker thread. With fallback=False errors are raised instead of
+    returning the template itinerary.
+    """
+    if config.ANTHROPIC_API_KEY == "your-api-key-here":
+        if not fallback:
+            raise RuntimeError("ANTHROPIC_API_KEY is not set")
+        return _template_fallback("no_api_key", destination, days, budget, travel_style, interests)
+    
+    if days > config.CHUNK_DAYS:
+        return await asyncio.to_thread(generate_itinerary, destination, days, budget,
+                                       travel_style, interests, start_date, fallback)
+    
+    cache_key = cache.make_key(destination, days, budget, travel_style, interests, start_date)
+    cached = _cached_itinerary(cache_key, destination, days, budget, travel_style, interests, start_date)
+    if cached is not None:
+        return cached
+    
+    try:
+        prompt = _build_prompt(destination, days, budget, travel_style, interests, start_date)
+        response_text = await _acreate_message(get_async_client(), prompt)
+        itinerary, cacheable = _parse_response(response_text, destination)
+        if not fallback and not itinerary.get("days"):
+            raise ValueError("No itinerary days in model output")
+        if not cacheable or len(itinerary.get("days") or []) != days:
+            added, complete = await asyncio.to_thread(
+                _complete_days, get_client(), itinerary, response_text, cacheable, destination, days,
+                budget, travel_style, interests, start_date, fallback
+            )
+            cacheable = cacheable and complete
+        if cacheable:
+            _cache_itinerary(cache_key, itinerary, destination, days, budget,
+                             travel_style, interests, start_date)
+        return itinerary
+    
     except Exception as e:
         print(f"Error generating itinerary: {e}")
-        return generate_template_itinerary(destination, days, budget, travel_style, interests)
+        if not fallback:
+            raise
+        return _template_fallback("error", destination, days, budget, travel_style, interests)
+
+
+async def generate_many(requests, concurrency=None):
+    """
+    Generate itineraries for many requests concurrently.
+
+    Each request is a dict of generate_itinerary keyword arguments. Results are
+    returned in the same order as the requests.
+    """
+    semaphore = asyncio.Semaphore(concurrency or config.BATCH_CONCURRENCY)
+    
+    async def run(request):
+        async with semaphore:
+            return await agenerate_itinerary(**request)
+    
+    try:
+        return await asyncio.gather(*(run(request) for request in requests))
+    finally:
+        await close_async_client()
 
 
 def generate_template_itinerary(destination, days, budget, travel_style, interests):
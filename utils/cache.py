@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import config
+from utils import metrics
+
+_local = threading.local()
+_stats = {}
+_stats_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+)
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (namespace, accessed_at, size)"
+
+
+class LRUCache:
+    """Small thread-safe in-process LRU mapping, optionally bounded by total value size"""
+
+    def __init__(self, max_items, max_bytes=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            if self.max_bytes is not None:
+                self._total_bytes += len(value) - self._sizes.get(key, 0)
+                self._sizes[key] = len(value)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items or (
+                    self.max_bytes is not None and self._total_bytes > self.max_bytes and len(self._data) > 1):
+                old_key, _ = self._data.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(old_key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _connect():
+    """Return this thread's connection to the on-disk cache database"""
+    conn = getattr(_local, "conn", None)
+    # Connections must not be shared with forked worker processes
+    if conn is not None and getattr(_local, "pid", None) == os.getpid():
+        return conn
+
+    directory = os.path.dirname(os.path.abspath(config.CACHE_DB_PATH))
+    os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(config.CACHE_DB_PATH, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # Serve reads from a memory-mapped view of the database file
+    conn.execute(f"PRAGMA mmap_size={config.CACHE_MMAP_BYTES}")
+    conn.execute(_SCHEMA)
+    conn.execute(_INDEX)
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def _count(namespace, field):
+    metrics.incr("cache_requests", namespace=namespace, result="hit" if field == "hits" else "miss")
+    with _stats_lock:
+        counts = _stats.setdefault(namespace, {"hits": 0, "misses": 0})
+        counts[field] += 1
+
+
+def _normalize_part(part):
+    if isinstance(part, bool) or part is None:
+        return str(part)
+    if isinstance(part, (int, float)):
+        return repr(float(part))
+    return " ".join(str(part).split()).casefold()
+
+
+def make_key(*parts):
+    """Build a stable cache key from normalized request parameters"""
+    raw = "\x1f".join(_normalize_part(part) for part in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def content_hash(data):
+    """Return a stable hash of an itinerary model or a JSON-serializable value, independent of key order"""
+    if hasattr(data, "to_bytes"):
+        raw = data.to_bytes()
+    else:
+        raw = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+def cache_get(namespace, key, ttl=None):
+    """Return the cached bytes for a key, or None on a miss or expired entry"""
+    if not config.CACHE_ENABLED:
+        return None
+
+    try:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT value, created_at, accessed_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (namespace, key)
+        ).fetchone()
+
+        now = time.time()
+        if row and ttl is not None and now - row[1] > ttl:
+            conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+            row = None
+
+        if row is None:
+            _count(namespace, "misses")
+            return None
+
+        # Every write is a transaction on the shared database, so hits only touch entries now and then
+        if now - row[2] > config.CACHE_TOUCH_INTERVAL:
+            conn.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, namespace, key)
+            )
+        _count(namespace, "hits")
+        return row[0]
+    except sqlite3.Error as e:
+        print(f"Error reading cache: {e}")
+        _count(namespace, "misses")
+        return None
+
+
+def cache_set(namespace, key, value, max_entries=None, max_bytes=None):
+    """Store bytes under a key and evict least recently used entries over the limits"""
+    if not config.CACHE_ENABLED:
+        return
+
+    try:
+        conn = _connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, size, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (namespace, key, sqlite3.Binary(value), len(value), now, now)
+        )
+        if max_entries is not None or max_bytes is not None:
+            _evict(conn, namespace, max_entries, max_bytes)
+    except sqlite3.Error as e:
+        print(f"Error writing cache: {e}")
+
+
+def _evict(conn, namespace, max_entries, max_bytes):
+    # Both only read the (namespace, accessed_at, size) index, not the values
+    if max_bytes is None:
+        entries, total = conn.execute(
+            "SELECT COUNT(*), 0 FROM cache_entries WHERE namespace = ?", (namespace,)
+        ).fetchone()
+    else:
+        entries, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?", (namespace,)
+        ).fetchone()
+
+    if max_entries is not None and entries > max_entries:
+        conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+            "SELECT key FROM cache_entries WHERE namespace = ? ORDER BY accessed_at LIMIT ?)",
+            (namespace, namespace, entries - max_entries)
+        )
+        if max_bytes is not None:
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM cache_entries WHERE namespace = ?", (namespace,)
+            ).fetchone()[0]
+
+    if max_bytes is not None and total > max_bytes:
+        # Keep the most recently used entries that fit in max_bytes
+        conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+            "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS running "
+            "FROM cache_entries WHERE namespace = ?) WHERE running > ?)",
+            (namespace, namespace, max_bytes)
+        )
+
+
+def get_json(namespace, key, ttl=None):
+    """Return a cached JSON value, or None"""
+    value = cache_get(namespace, key, ttl=ttl)
+    if value is None:
+        return None
+    return json.loads(value)
+
+
+def set_json(namespace, key, data, max_entries=None, max_bytes=None):
+    """Store a JSON-serializable value"""
+    value = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    cache_set(namespace, key, value, max_entries=max_entries, max_bytes=max_bytes)
+
+
+def clear_cache(namespace=None):
+    """Remove every entry, or only the entries of one namespace"""
+    conn = _connect()
+    if namespace is None:
+        conn.execute("DELETE FROM cache_entries")
+    else:
+        conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+
+
+def cache_stats():
+    """Return hit/miss counts for this process and entry counts on disk per namespace"""
+    with _stats_lock:
+        stats = {namespace: dict(counts) for namespace, counts in _stats.items()}
+
+    try:
+        rows = _connect().execute(
+            "SELECT namespace, COUNT(*), SUM(size) FROM cache_entries GROUP BY namespace"
+        ).fetchall()
+    except sqlite3.Error:
+        rows = []
+
+    for namespace, entries, size in rows:
+        counts = stats.setdefault(namespace, {"hits": 0, "misses": 0})
+        counts["entries"] = entries
+        counts["bytes"] = size or 0
+
+    return stats
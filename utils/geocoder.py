@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from collections import deque
+import config
+from utils import singleflight
+from utils.singleflight import Call
+
+
+class GeocodeResolver:
+    """
+    Process-wide queue for geocoder lookups that missed every cache.
+
+    Each query is looked up once however many itineraries and sessions ask
+    for it at the same time; later callers share the first caller's pending
+    call. One worker thread drains the queue in FIFO order and starts at most
+    one lookup per min_interval seconds, as Nominatim's usage policy requires.
+    With a shared_key the spacing also holds across every process using the
+    same cache directory: the time of the last lookup is kept in a file
+    guarded by that key's file lock.
+    """
+
+    def __init__(self, lookup, min_interval=1.0, shared_key=None):
+        self.lookup = lookup
+        self.min_interval = min_interval
+        self.shared_key = shared_key
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._pending = {}
+        self._worker = None
+        self._last_lookup = 0.0
+        self._completed = 0
+
+    def submit(self, key, query):
+        """Queue query unless a lookup for key is already queued or running; returns its Call"""
+        with self._cond:
+            call = self._pending.get(key)
+            if call is None:
+                call = self._pending[key] = Call()
+                self._queue.append((key, query))
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="geocode-resolver", daemon=True)
+                    self._worker.start()
+                self._cond.notify()
+            return call
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                key, query = self._queue.popleft()
+                call = self._pending[key]
+
+            self._wait_turn()
+            try:
+                call.resolve(self.lookup(query))
+            except Exception as e:
+                call.fail(e)
+            with self._cond:
+                del self._pending[key]
+                self._completed += 1
+
+    def _wait_turn(self):
+        """Sleep until min_interval has passed since the last lookup"""
+        if self.shared_key is None or self.min_interval <= 0:
+            delay = self._last_lookup + self.min_interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self._last_lookup = time.time()
+            return
+
+        # Other processes wait on the lock, so the sleep spaces their lookups too
+        with singleflight.file_lock(self.shared_key):
+            directory = os.path.dirname(os.path.abspath(config.CACHE_DB_PATH))
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{self.shared_key}.last")
+            try:
+                with open(path, encoding="utf-8") as f:
+                    last = max(float(f.read()), self._last_lookup)
+            except (OSError, ValueError):
+                last = self._last_lookup
+            delay = last + self.min_interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self._last_lookup = time.time()
+            try:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(repr(self._last_lookup))
+            except OSError as e:
+                print(f"Error recording geocoder lookup time: {e}")
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "in_flight": len(self._pending) - len(self._queue),
+                "completed": self._completed,
+                "min_interval": self.min_interval
+            }
+
+
+def wait_for(calls, timeout):
+    """
+    Wait up to timeout seconds in total for {name: call}. Returns {name: result}
+    for the calls that finished (None for failed ones) and removes them from calls.
+    """
+    deadline = time.monotonic() + timeout
+    finished = {}
+    for name, call in list(calls.items()):
+        try:
+            finished[name] = call.wait(max(0, deadline - time.monotonic()))
+        except TimeoutError:
+            continue
+        except Exception:
+            finished[name] = None
+        del calls[name]
+    return finished
@@ -0,0 +1,243 @@
+import json
+
+
+class IncrementalItineraryParser:
+    """Parse streamed model output and report each top-level section and day as soon as it closes
+
+    Text is fed in arbitrary chunks. Anything before the first ``{`` (such as a
+    markdown fence) is ignored. ``feed`` returns a list of events:
+
+    - ``("day", day_dict)`` for every completed object in the ``days`` array
+    - ``("section", key, value)`` for every completed top-level key
+    """
+
+    def __init__(self):
+        self.sections = {}
+        self.done = False
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._stage = "key"
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+        self._day_start = None
+
+    def feed(self, chunk):
+        """Consume the next piece of text and return the events it completed"""
+        self._text += chunk
+        events = []
+        text = self._text
+
+        for i in range(self._pos, len(text)):
+            if self.done:
+                break
+            c = text[i]
+
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._stage == "key_string":
+                        self._key = json.loads(text[self._key_start:i + 1])
+                        self._stage = "colon"
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._stage == "key":
+                        self._stage = "key_string"
+                        self._key_start = i
+                    elif self._stage == "value_wait":
+                        self._stage = "value"
+                        self._value_start = i
+                continue
+
+            if c.isspace():
+                continue
+
+            if self._depth == 1:
+                if self._stage == "colon" and c == ":":
+                    self._stage = "value_wait"
+                    continue
+                if self._stage == "value_wait":
+                    self._stage = "value"
+                    self._value_start = i
+
+            if c in "{[":
+                self._depth += 1
+                if self._key == "days" and self._depth == 3 and c == "{":
+                    self._day_start = i
+            elif c in "}]":
+                self._depth -= 1
+                if self._key == "days" and self._depth == 2 and self._day_start is not None:
+                    day = self._loads(text[self._day_start:i + 1])
+                    if isinstance(day, dict):
+                        events.append(("day", day))
+                    self._day_start = None
+                if self._depth == 0:
+                    self._close_value(text, i, events)
+                    self.done = True
+            elif c == "," and self._depth == 1:
+                self._close_value(text, i, events)
+                self._stage = "key"
+
+        self._pos = len(text)
+        return events
+
+    def _close_value(self, text, end, events):
+        if self._stage != "value" or self._value_start is None:
+            return
+        value = self._loads(text[self._value_start:end].strip())
+        if value is not None:
+            self.sections[self._key] = value
+            events.append(("section", self._key, value))
+        self._value_start = None
+
+    @staticmethod
+    def _loads(raw):
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+
+_CLOSERS = {"{": "}", "[": "]"}
+# Truncated output is only cut at the level of top-level values and their direct
+# elements, so a partially written day is dropped rather than kept half-empty
+_SALVAGE_DEPTH = 2
+_STRING_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def extract_json(text):
+    """
+    Find the JSON object in raw model output and parse it, repairing common defects.
+
+    Handles surrounding prose or markdown fences, trailing commas, unescaped
+    quotes and raw newlines inside strings, and output truncated mid-object
+    (everything after the last complete value is dropped and the open objects
+    and arrays are closed, so every fully-formed day is kept).
+
+    Returns (data, repairs, truncated). data is None when no object could be
+    recovered; repairs is a list of human-readable descriptions of the fixes.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None, [], False
+
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    complete = False
+    # Output length and open containers at the last point where every value was complete
+    safe_point = None
+    trailing_commas = quotes = control_chars = 0
+    n = len(text)
+
+    for i in range(start, n):
+        c = text[i]
+
+        if in_string:
+            if escape:
+                escape = False
+                out.append(c)
+            elif c == "\\":
+                escape = True
+                out.append(c)
+            elif c == '"':
+                # A quote only closes the string if JSON structure follows it
+                j = i + 1
+                while j < n and text[j] in " \t\r\n":
+                    j += 1
+                if j >= n or text[j] in ",:}]":
+                    in_string = False
+                    out.append(c)
+                else:
+                    quotes += 1
+                    out.append('\\"')
+            elif c in _STRING_ESCAPES:
+                control_chars += 1
+                out.append(_STRING_ESCAPES[c])
+            else:
+                out.append(c)
+            continue
+
+        if c == '"':
+            in_string = True
+            out.append(c)
+        elif c in "{[":
+            stack.append(c)
+            out.append(c)
+        elif c in "}]":
+            k = len(out) - 1
+            while k >= 0 and out[k] in " \t\r\n":
+                k -= 1
+            if k >= 0 and out[k] == ",":
+                del out[k]
+                trailing_commas += 1
+            if not stack:
+                break
+            out.append(_CLOSERS[stack.pop()])
+            if not stack:
+                complete = True
+                break
+            if len(stack) <= _SALVAGE_DEPTH:
+                safe_point = (len(out), tuple(stack))
+        elif c == ",":
+            if len(stack) <= _SALVAGE_DEPTH:
+                safe_point = (len(out), tuple(stack))
+            out.append(c)
+        else:
+            out.append(c)
+
+    repairs = []
+    if trailing_commas:
+        repairs.append(f"removed {trailing_commas} trailing comma(s)")
+    if quotes:
+        repairs.append(f"escaped {quotes} unescaped quote(s)")
+    if control_chars:
+        repairs.append(f"escaped {control_chars} raw control character(s) in strings")
+
+    if complete:
+        data = _loads_object("".join(out))
+        return data, repairs, False
+
+    # Truncated: first try closing everything as-is, then fall back to the last complete value.
+    # Output cut off inside a number or literal ("45" of 450) can't be trusted as-is
+    candidates = []
+    cut_in_scalar = bool(out) and (out[-1].isalnum() or out[-1] in "+-.")
+    if not in_string and not cut_in_scalar and len(stack) <= _SALVAGE_DEPTH:
+        candidates.append("".join(out) + "".join(_CLOSERS[opener] for opener in reversed(stack)))
+    if safe_point is not None:
+        length, open_stack = safe_point
+        candidates.append("".join(out[:length]) + "".join(_CLOSERS[opener] for opener in reversed(open_stack)))
+
+    for candidate in candidates:
+        data = _loads_object(candidate)
+        if data is not None:
+            repairs.append("closed output that was truncated before the end of the JSON object")
+            return data, repairs, True
+
+    return None, repairs, True
+
+
+def _loads_object(raw):
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+import config
+from utils import cache
+from utils.models import Itinerary
+
+
+class ItineraryStore:
+    """
+    Process-wide store that holds each distinct itinerary once.
+
+    Itineraries are keyed by content hash, so sessions holding the same plan
+    share one immutable object and only keep the key in their session state.
+    Every itinerary is also written to the shared disk cache in its compact
+    binary form. The in-memory tier evicts itineraries no live session refers
+    to first, and anything evicted is reloaded from disk on the next access.
+    Session references expire after session_ttl seconds without access,
+    since Streamlit gives no signal when a session ends.
+    """
+
+    def __init__(self, max_items, session_ttl):
+        self.max_items = max_items
+        self.session_ttl = session_ttl
+        self._items = OrderedDict()
+        self._refs = {}
+        self._session_keys = {}
+        self._lock = threading.Lock()
+
+    def put(self, itinerary, session_id=None):
+        """Store an itinerary and return its key; the session's previous itinerary is released"""
+        itinerary = Itinerary.coerce(itinerary)
+        key = cache.content_hash(itinerary)
+
+        with self._lock:
+            known = key in self._items
+            if known:
+                # Keep the existing object so every session shares one copy
+                self._items.move_to_end(key)
+            else:
+                self._items[key] = itinerary
+            if session_id is not None:
+                self._reference(key, session_id)
+            self._evict()
+
+        if not known:
+            cache.cache_set("itinerary_store", key, itinerary.to_bytes(),
+                            max_entries=config.ITINERARY_STORE_MAX_ENTRIES)
+        return key
+
+    def get(self, key, session_id=None):
+        """Return the itinerary for a key, loading it from disk if needed, or None if it is gone"""
+        if key is None:
+            return None
+
+        with self._lock:
+            itinerary = self._items.get(key)
+            if itinerary is not None:
+                self._items.move_to_end(key)
+                if session_id is not None:
+                    self._reference(key, session_id)
+                return itinerary
+
+        payload = cache.cache_get("itinerary_store", key)
+        if payload is None:
+            return None
+        itinerary = Itinerary.from_bytes(bytes(payload))
+
+        with self._lock:
+            itinerary = self._items.setdefault(key, itinerary)
+            if session_id is not None:
+                self._reference(key, session_id)
+            self._evict()
+        return itinerary
+
+    def release(self, session_id):
+        """Drop the session's reference to its current itinerary"""
+        with self._lock:
+            key = self._session_keys.pop(session_id, None)
+            if key is not None:
+                self._refs.get(key, {}).pop(session_id, None)
+                if not self._refs.get(key):
+                    self._refs.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            self._expire_sessions()
+            return {
+                "in_memory": len(self._items),
+                "referenced": len(self._refs),
+                "sessions": len(self._session_keys)
+            }
+
+    def _reference(self, key, session_id):
+        previous = self._session_keys.get(session_id)
+        if previous is not None and previous != key:
+            self._refs.get(previous, {}).pop(session_id, None)
+            if not self._refs.get(previous):
+                self._refs.pop(previous, None)
+        self._session_keys[session_id] = key
+        self._refs.setdefault(key, {})[session_id] = time.monotonic()
+
+    def _expire_sessions(self):
+        cutoff = time.monotonic() - self.session_ttl
+        for key in list(self._refs):
+            sessions = self._refs[key]
+            for session_id, last_seen in list(sessions.items()):
+                if last_seen < cutoff:
+                    del sessions[session_id]
+                    if self._session_keys.get(session_id) == key:
+                        del self._session_keys[session_id]
+            if not sessions:
+                del self._refs[key]
+
+    def _evict(self):
+        if len(self._items) <= self.max_items:
+            return
+        self._expire_sessions()
+
+        # Least recently used unreferenced itineraries go first
+        for key in list(self._items):
+            if len(self._items) <= self.max_items:
+                return
+            if key not in self._refs:
+                del self._items[key]
+
+        # Still over the limit: drop referenced ones too, they reload from disk
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+
+itinerary_store = ItineraryStore(
+    max_items=config.ITINERARY_STORE_MEMORY_ITEMS,
+    session_ttl=config.ITINERARY_STORE_SESSION_TTL
+)
@@ -1,25 +1,255 @@
-import folium
-from geopy.geocoders import Nominatim
+import csv
+import html
+import os
+import re
+import threading
 import config
+from utils import cache, metrics
+from utils.geocoder import GeocodeResolver, wait_for
+from utils.models import Itinerary
+
+# Bump when the drawn map changes; rendered maps cached by older versions are then ignored
+MAP_FORMAT_VERSION = 4
+# Coordinates of a place the geocoder didn't find
+NOT_FOUND = ()
+DAY_COLORS = ['blue', 'green', 'purple', 'orange', 'darkred']
+
+_geolocator = None
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+_memory_cache = cache.LRUCache(config.GEOCODE_MEMORY_CACHE_SIZE)
+_map_html_cache = cache.LRUCache(config.MAP_HTML_MEMORY_CACHE_ITEMS)
+
+
+def _normalize_location(location):
+    return " ".join(str(location).split()).casefold()
+
+
+def _get_geolocator():
+    """Return the shared Nominatim geolocator"""
+    global _geolocator
+    if _geolocator is None:
+        from geopy.geocoders import Nominatim
+        _geolocator = Nominatim(user_agent="student_travel_planner",
+                                domain=config.NOMINATIM_DOMAIN, scheme=config.NOMINATIM_SCHEME)
+    return _geolocator
+
+
+def _load_gazetteer():
+    """Load the bundled table of major cities, indexed by normalized name"""
+    global _gazetteer
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            path = config.GAZETTEER_PATH
+            if not os.path.isabs(path):
+                path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+
+            index = {}
+            try:
+                with open(path, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        coords = (float(row["latitude"]), float(row["longitude"]))
+                        name = _normalize_location(row["name"])
+                        index.setdefault(name, coords)
+                        index[f"{name}, {_normalize_location(row['country'])}"] = coords
+            except OSError as e:
+                print(f"Error loading gazetteer: {e}")
+            _gazetteer = index
+    return _gazetteer
+
+
+def _cached_coordinates(key):
+    """Return (coords, source) from the memory, gazetteer or disk cache; coords is None when unknown"""
+    coords = _memory_cache.get(key)
+    if coords is not None:
+        return coords, "memory"
+    
+    source = "gazetteer"
+    coords = _load_gazetteer().get(key)
+    if coords is None:
+        source = "disk"
+        cached = cache.get_json("geocode", key)
+        if cached is not None:
+            coords = tuple(cached)
+        elif cache.get_json("geocode_miss", key, ttl=config.GEOCODE_MISS_TTL):
+            coords = NOT_FOUND
+    
+    if coords is not None:
+        _memory_cache.set(key, coords)
+    return coords, source
+
+
+def _geocode(location):
+    """Look a location up with Nominatim and cache the answer; runs on the resolver's worker thread"""
+    key = _normalize_location(location)
+    
+    with metrics.span("geocode", source="nominatim"):
+        try:
+            location_data = _get_geolocator().geocode(location)
+        except Exception as e:
+            # Remembered only briefly, so the place is tried again once GEOCODE_ERROR_TTL has passed
+            print(f"Error getting coordinates: {e}")
+            metrics.incr("errors", stage="geocode")
+            cache.set_json("geocode_error", key, True, max_entries=config.GEOCODE_CACHE_MAX_ENTRIES)
+            return None
+    
+    if location_data:
+        coords = (location_data.latitude, location_data.longitude)
+        cache.set_json("geocode", key, coords, max_entries=config.GEOCODE_CACHE_MAX_ENTRIES)
+    else:
+        metrics.incr("geocode_not_found")
+        coords = NOT_FOUND
+        cache.set_json("geocode_miss", key, True, max_entries=config.GEOCODE_CACHE_MAX_ENTRIES)
+    
+    metrics.incr("geocode_lookups", source="nominatim")
+    _memory_cache.set(key, coords)
+    return coords
+
+
+# Every lookup that misses the caches goes through this one queue, whichever session asked;
+# the spacing between lookups also holds across worker processes
+geocode_resolver = GeocodeResolver(_geocode, min_interval=config.GEOCODE_MIN_INTERVAL, shared_key="nominatim")
+
+
+def resolve_locations(locations):
+    """
+    Look up many locations at once. Cached ones are returned right away as
+    {location: coords}, with None for ones whose lookup failed recently; the
+    rest are queued with the resolver and returned as {location: call}.
+    """
+    resolved = {}
+    pending = {}
+    for location in dict.fromkeys(locations):
+        key = _normalize_location(location)
+        coords, source = _cached_coordinates(key)
+        if coords is not None:
+            metrics.incr("geocode_lookups", source=source)
+            resolved[location] = coords
+        elif cache.get_json("geocode_error", key, ttl=config.GEOCODE_ERROR_TTL):
+            metrics.incr("geocode_lookups", source="failed")
+            resolved[location] = None
+        else:
+            pending[location] = geocode_resolver.submit(key, location)
+    return resolved, pending
+
 
 def get_coordinates(location):
     """Get latitude and longitude for a given location"""
-    try:
-        geolocator = Nominatim(user_agent="student_travel_planner")
-        location_data = geolocator.geocode(location)
-        
-        if location_data:
-            return location_data.latitude, location_data.longitude
-        else:
-            return 0, 0
-    except Exception as e:
-        print(f"Error getting coordinates: {e}")
-        return 0, 0
+    resolved, pending = resolve_locations([location])
+    if pending:
+        resolved.update(wait_for(pending, config.GEOCODE_WAIT_TIMEOUT))
+    return resolved.get(location) or (0, 0)
+
 
+# Runs of capitalised words, with the small words place names contain ("Museum of Modern Art", "Place d'Italie")
+_PROPER_NAME = re.compile(r"[A-ZÀ-Þ][\w'’.&-]*(?:\s+(?:(?:of|the|de|du|des|la|le|del|di|and)\s+|[dl]['’])*[A-ZÀ-Þ][\w'’.&-]*)*")
+_AFTER_PREPOSITION = re.compile(r"\b(?:at|to|near|around|in|through|along|of)\s+(?:the\s+)?(.+)", re.IGNORECASE)
+_NOTES = re.compile(r"\([^)]*\)|\$\s?\d[\d,.]*")
+_LEADING_VERB = re.compile(r"^(?:visit|explore|see|discover|enjoy|tour|check out|head to|go to)\s+(?:the\s+)?",
+                           re.IGNORECASE)
 
-def create_travel_map(destination, itinerary_data=None):
-    """Create an interactive map for the travel destination"""
-    lat, lon = get_coordinates(destination)
+
+def place_name(text):
+    """
+    Best guess at the place an activity or accommodation line refers to.
+    Only proper names count, so generic lines ("Lunch at a local cafe") give "".
+    """
+    text = _NOTES.sub("", str(text)).split(":")[-1]
+    text = re.split(r"\s[-–—]\s|[;,]", text)[0].strip()
+    rest = _LEADING_VERB.sub("", text)
+    
+    # A capitalised word that only starts the sentence ("Picnic", "Walking") is not a name,
+    # unless it follows a verb that was stripped ("Explore Montmartre")
+    names = [m for m in _PROPER_NAME.finditer(rest) if m.start() > 0 or " " in m.group() or rest != text]
+    if not names:
+        return ""
+    # "Take the RER to Versailles": the name after the preposition is where the traveler goes
+    match = _AFTER_PREPOSITION.search(rest)
+    destinations = [m for m in names if match and m.start() >= match.start(1)]
+    return max(destinations or names, key=lambda m: len(m.group())).group().strip(" .")
+
+
+def place_query(destination, text):
+    """The geocoder query for the place a line of the itinerary names, or None"""
+    name = place_name(text)
+    if name and _normalize_location(name) != _normalize_location(destination):
+        return f"{name}, {destination}"
+    return None
+
+
+def itinerary_places(destination, itinerary_data):
+    """Every activity and accommodation that names a place, with the query to geocode it by"""
+    itinerary = Itinerary.coerce(itinerary_data)
+    places = []
+    if not itinerary:
+        return places
+    
+    for day in itinerary.days:
+        entries = [("activity", activity.time, activity.activity) for activity in day.activities]
+        if day.accommodation:
+            entries.append(("accommodation", "", day.accommodation))
+        for kind, time_slot, label in entries:
+            query = place_query(destination, label)
+            if query:
+                places.append({"day": day.day, "kind": kind, "time": time_slot, "label": label, "query": query})
+    return places
+
+
+def locate_places(destination, places, timeout=0):
+    """
+    Return ({query: coords}, pending) for the destination and places, waiting
+    up to timeout seconds for the ones that aren't cached. pending counts the
+    places still being looked up; they are left out of the coordinates.
+    """
+    coordinates, pending = resolve_locations([destination] + [place["query"] for place in places])
+    if pending and timeout:
+        coordinates.update(wait_for(pending, timeout))
+    return coordinates, len(pending)
+
+
+def place_lookups(destination, itinerary_data):
+    """The lookups still running for the destination and places of an itinerary, as {query: call}"""
+    places = itinerary_places(destination, itinerary_data)
+    return resolve_locations([destination] + [place["query"] for place in places])[1]
+
+
+def itinerary_geojson(places, coordinates):
+    """
+    A compact GeoJSON FeatureCollection of the places that have coordinates.
+    Coordinates are rounded to about a metre and properties use short keys:
+    d (day), k ("a" activity or "h" accommodation), t (time), l (label, HTML-escaped).
+    """
+    features = []
+    for place in places:
+        coords = coordinates.get(place["query"])
+        if not coords:
+            continue
+        properties = {"d": place["day"], "k": "h" if place["kind"] == "accommodation" else "a",
+                      "l": html.escape(place["label"])}
+        if place["time"]:
+            properties["t"] = html.escape(place["time"])
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(coords[1], 5), round(coords[0], 5)]},
+            "properties": properties
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def create_travel_map(destination, itinerary_data=None, coordinates=None):
+    """
+    Create an interactive map showing every located activity and
+    accommodation, clustered and switchable by day. coordinates maps geocoder
+    queries to (lat, lon); without it every place is looked up first.
+    """
+    # folium is slow to import, so it is only loaded once a map is actually drawn
+    import folium
+    
+    itinerary = Itinerary.coerce(itinerary_data)
+    places = itinerary_places(destination, itinerary)
+    if coordinates is None:
+        coordinates = locate_places(destination, places, timeout=config.GEOCODE_WAIT_TIMEOUT)[0]
+    lat, lon = coordinates.get(destination) or (0, 0)
     
     travel_map = folium.Map(
         location=[lat, lon],
@@ -29,23 +259,73 @@ def create_travel_map(destination, itinerary_data=None):
     
     folium.Marker(
         [lat, lon],
-        popup=f"<b>{destination}</b><br>Your destination!",
-        tooltip=destination,
+        popup=f"<b>{html.escape(destination)}</b><br>Your destination!",
+        tooltip=html.escape(destination),
         icon=folium.Icon(color='red', icon='info-sign')
     ).add_to(travel_map)
     
-    if itinerary_data and 'days' in itinerary_data:
-        colors = ['blue', 'green', 'purple', 'orange', 'darkred']
-        
-        for idx, day in enumerate(itinerary_data['days']):
-            color = colors[idx % len(colors)]
-            folium.Circle(
-                [lat + (idx * 0.02 - 0.04), lon + (idx * 0.02 - 0.04)],
-                radius=500,
-                popup=f"<b>Day {day['day']}</b><br>{day['title']}",
-                color=color,
-                fill=True,
-                fillOpacity=0.3
-            ).add_to(travel_map)
+    # All places go into one clustered GeoJSON layer, so long trips don't add a script block per marker
+    data = itinerary_geojson(places, coordinates)
+    if data["features"]:
+        from utils.map_layers import ItineraryLayer
+        ItineraryLayer(data, DAY_COLORS).add_to(travel_map)
+        located = [[lat, lon]] if coordinates.get(destination) else []
+        located += [feature["geometry"]["coordinates"][::-1] for feature in data["features"]]
+        travel_map.fit_bounds(located)
     
     return travel_map
+
+
+def travel_map_html(destination, itinerary_data=None, timeout=0):
+    """
+    Return (html, pending) for the travel map.
+    
+    Places that aren't cached are queued for lookup, and the map is drawn
+    after waiting up to timeout seconds for them. pending is the number of
+    places still missing from it, so the caller can draw it again later.
+    Only complete maps are cached, by destination and itinerary content;
+    partial ones are kept in memory by the places they show, so redrawing
+    before any new place is located doesn't build the map again.
+    """
+    itinerary = Itinerary.coerce(itinerary_data)
+    key = cache.make_key(MAP_FORMAT_VERSION, destination, cache.content_hash(itinerary))
+    
+    html_doc = _map_html_cache.get(key)
+    if html_doc is not None:
+        return html_doc, 0
+    cached = cache.cache_get("map_html", key, ttl=config.MAP_HTML_CACHE_TTL)
+    if cached is not None:
+        html_doc = bytes(cached).decode("utf-8")
+        _map_html_cache.set(key, html_doc)
+        return html_doc, 0
+    
+    places = itinerary_places(destination, itinerary)
+    coordinates, pending = locate_places(destination, places, timeout=timeout)
+    # Lookups that failed are retried later, so a map missing them isn't complete either
+    complete = not pending and None not in coordinates.values()
+    if not complete:
+        partial_key = cache.make_key(key, *sorted(query for query, coords in coordinates.items() if coords))
+        html_doc = _map_html_cache.get(partial_key)
+        if html_doc is not None:
+            return html_doc, pending
+    
+    with metrics.span("map_build"):
+        import folium
+        travel_map = create_travel_map(destination, itinerary, coordinates)
+        html_doc = folium.Figure().add_child(travel_map).render()
+    
+    if complete:
+        cache.cache_set("map_html", key, html_doc.encode("utf-8"), max_bytes=config.MAP_HTML_CACHE_MAX_BYTES)
+        _map_html_cache.set(key, html_doc)
+    else:
+        _map_html_cache.set(partial_key, html_doc)
+    return html_doc, pending
+
+
+def get_travel_map_html(destination, itinerary_data=None):
+    """
+    Return the rendered HTML document for the travel map, once every place is
+    located or GEOCODE_WAIT_TIMEOUT has passed.
+    The map is only rebuilt when the destination or itinerary content changes.
+    """
+    return travel_map_html(destination, itinerary_data, timeout=config.GEOCODE_WAIT_TIMEOUT)[0]
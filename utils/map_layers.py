@@ -0,0 +1,89 @@
+import json
+from jinja2 import Template
+from folium.elements import JSCSSMixin, MacroElement
+from folium.plugins import MarkerCluster
+
+
+class ItineraryLayer(JSCSSMixin, MacroElement):
+    """
+    Every located place of an itinerary as one GeoJSON layer.
+
+    The features are embedded once as a compact FeatureCollection and turned
+    into markers in the browser, clustered with Leaflet.markercluster, with a
+    checkbox per day to show or hide it. The page grows by one small feature
+    per place instead of one script block per marker.
+
+    Features carry short properties: d (day), k ("a" activity or
+    "h" accommodation), t (time) and l (label, already HTML-escaped).
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        (function() {
+            var data = {{ this.data }};
+            var colors = {{ this.colors|tojson }};
+            var cluster = L.markerClusterGroup({{ this.options|tojson }});
+            var days = {};
+            var color = function(day) { return colors[(day - 1 + colors.length) % colors.length]; };
+
+            L.geoJSON(data, {
+                pointToLayer: function(feature, latlng) {
+                    var p = feature.properties;
+                    return L.circleMarker(latlng, {
+                        radius: p.k === "h" ? 9 : 7, color: color(p.d), weight: p.k === "h" ? 3 : 2, fillOpacity: 0.7
+                    });
+                },
+                onEachFeature: function(feature, layer) {
+                    var p = feature.properties;
+                    var heading = "Day " + p.d + (p.t ? " · " + p.t : "") + (p.k === "h" ? " · Stay" : "");
+                    layer.bindPopup("<b>" + heading + "</b><br>" + p.l, {maxWidth: 250});
+                    layer.bindTooltip(p.l);
+                    (days[p.d] = days[p.d] || []).push(layer);
+                }
+            });
+
+            var control = L.control({position: "topright"});
+            control.onAdd = function() {
+                var div = L.DomUtil.create("div", "leaflet-control-layers leaflet-control-layers-expanded");
+                div.style.maxHeight = "300px";
+                div.style.overflowY = "auto";
+                L.DomEvent.disableClickPropagation(div);
+                L.DomEvent.disableScrollPropagation(div);
+                var html = "<label><input type='checkbox' data-all checked> <b>All days</b></label>";
+                Object.keys(days).forEach(function(day) {
+                    html += "<label><input type='checkbox' data-day='" + day + "' checked> " +
+                        "<span style='color:" + color(+day) + "'>&#9679;</span> Day " + day + "</label>";
+                });
+                div.innerHTML = html;
+                div.addEventListener("change", function(event) {
+                    var boxes = div.querySelectorAll("input[data-day]");
+                    if (event.target.hasAttribute("data-all")) {
+                        boxes.forEach(function(box) { box.checked = event.target.checked; });
+                    }
+                    cluster.clearLayers();
+                    boxes.forEach(function(box) {
+                        if (box.checked) { cluster.addLayers(days[box.getAttribute("data-day")]); }
+                    });
+                });
+                return div;
+            };
+
+            Object.keys(days).forEach(function(day) { cluster.addLayers(days[day]); });
+            cluster.addTo({{ this._parent.get_name() }});
+            if (Object.keys(days).length > 1) { control.addTo({{ this._parent.get_name() }}); }
+        })();
+        {% endmacro %}
+        """
+    )
+
+    default_js = MarkerCluster.default_js
+    default_css = MarkerCluster.default_css
+
+    def __init__(self, data, colors, **options):
+        super().__init__()
+        self._name = "ItineraryLayer"
+        # Serialized here without whitespace; "<" is escaped so the JSON can't close the script tag
+        self.data = json.dumps(data, separators=(",", ":")).replace("<", "\\u003c")
+        self.colors = colors
+        self.options = dict({"chunkedLoading": True, "maxClusterRadius": 40}, **options)
@@ -0,0 +1,211 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config
+from utils import singleflight
+
+# Upper bounds, in seconds, of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_counters = {}
+_timings = {}
+_log_lock = threading.Lock()
+_last_export = 0.0
+_server = None
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def incr(name, value=1, **labels):
+    """Add value to a counter, e.g. incr("llm_tokens", 120, type="output")"""
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(stage, seconds, **labels):
+    """Record one timing of a stage"""
+    key = (stage, _label_key(labels))
+    with _lock:
+        timing = _timings.get(key)
+        if timing is None:
+            timing = _timings[key] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * len(BUCKETS)}
+        timing["count"] += 1
+        timing["sum"] += seconds
+        timing["max"] = max(timing["max"], seconds)
+        for idx, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                timing["buckets"][idx] += 1
+                break
+
+
+@contextmanager
+def span(stage, **labels):
+    """
+    Time a block as one stage. Yields the label dict, so labels only known at
+    the end (cache source, token counts) can be added inside the block.
+    Spans that raise are recorded with outcome="error".
+    """
+    if not config.METRICS_ENABLED:
+        yield labels
+        return
+
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield labels
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        # Token counts and similar details go to the log, not the timing labels
+        details = {k: labels.pop(k) for k in [k for k, v in labels.items() if isinstance(v, (int, float))]}
+        observe(stage, elapsed, outcome=outcome, **labels)
+        _log(dict(labels, stage=stage, outcome=outcome, seconds=round(elapsed, 4), **details))
+        _maybe_export()
+
+
+def append_jsonl(path, record, max_bytes=None):
+    """
+    Append record as one JSON line to path. Once the file reaches max_bytes it
+    is moved to <path>.1, replacing the previous one, so at most two files are kept.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    line = json.dumps(record, separators=(",", ":"), default=str) + "\n"
+    with _log_lock:
+        if max_bytes and os.path.exists(path) and os.path.getsize(path) >= max_bytes:
+            # Checked again under the file lock so only one worker process rotates
+            with singleflight.file_lock(f"rotate:{os.path.abspath(path)}"):
+                if os.path.exists(path) and os.path.getsize(path) >= max_bytes:
+                    os.replace(path, f"{path}.1")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+def _log(record):
+    """Append a structured record to the metrics log"""
+    if not config.METRICS_LOG_PATH:
+        return
+    record["ts"] = round(time.time(), 3)
+    try:
+        append_jsonl(config.METRICS_LOG_PATH, record, config.METRICS_LOG_MAX_BYTES)
+    except OSError as e:
+        print(f"Error writing metrics log: {e}")
+
+
+def snapshot():
+    """Return copies of the counters and timings, keyed by (name, labels)"""
+    with _lock:
+        counters = dict(_counters)
+        timings = {key: dict(value, buckets=list(value["buckets"])) for key, value in _timings.items()}
+    return counters, timings
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timings.clear()
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+
+
+def _escape_label(value):
+    """Escape a label value as the Prometheus text format requires"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus():
+    """Render every counter and timing in the Prometheus text exposition format"""
+    counters, timings = snapshot()
+    lines = []
+
+    for name in sorted({name for name, _ in counters}):
+        metric = f"travel_planner_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for (counter_name, labels), value in sorted(counters.items()):
+            if counter_name == name:
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    if timings:
+        metric = "travel_planner_stage_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for (stage, labels), timing in sorted(timings.items()):
+            labels = (("stage", stage),) + labels
+            cumulative = 0
+            for bound, count in zip(BUCKETS, timing["buckets"]):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {timing['count']}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {timing['sum']:.6f}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {timing['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path=None):
+    """Write the Prometheus text to a file, for node_exporter's textfile collector or similar"""
+    path = path or config.METRICS_PROM_PATH
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def _maybe_export():
+    global _last_export
+    if not config.METRICS_PROM_PATH:
+        return
+    now = time.monotonic()
+    with _lock:
+        if now - _last_export < config.METRICS_EXPORT_INTERVAL:
+            return
+        _last_export = now
+    try:
+        write_prometheus()
+    except OSError as e:
+        print(f"Error writing metrics file: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port=None):
+    """Serve /metrics on a background thread; safe to call on every Streamlit rerun"""
+    global _server
+    port = port or config.METRICS_PORT
+    with _lock:
+        if _server is not None or not port:
+            return _server
+        try:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        except OSError as e:
+            print(f"Error starting metrics server: {e}")
+            # Don't retry on every rerun
+            _server = False
+            return None
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
@@ -0,0 +1,316 @@
+import marshal
+import math
+import zlib
+from dataclasses import dataclass
+
+# Bump when the tuple layout below changes; older payloads are then rejected
+FORMAT_VERSION = 1
+# marshal version 2 never emits back-references, so equal itineraries serialize to equal bytes
+_MARSHAL_VERSION = 2
+
+
+def _text(value, default=""):
+    if value is None:
+        return default
+    return str(value)
+
+
+def _number(value, default=0):
+    """Coerce a cost-like value ("$12", "12.5", 12) to an int or float"""
+    if isinstance(value, bool) or value is None:
+        return default
+    if isinstance(value, int):
+        return value
+    try:
+        number = float(value if isinstance(value, float) else str(value).replace("$", "").replace(",", "").strip())
+    except (ValueError, OverflowError):
+        return default
+    # "inf" and "nan" parse as floats but aren't amounts, and int() of them raises
+    if not math.isfinite(number):
+        return default
+    if isinstance(value, float):
+        return value
+    return int(number) if number.is_integer() else number
+
+
+def _dict(value):
+    return value if isinstance(value, dict) else {}
+
+
+@dataclass(frozen=True, slots=True)
+class Activity:
+    time: str
+    activity: str
+    cost: float = 0
+    tips: str = ""
+
+    @classmethod
+    def from_dict(cls, data):
+        data = _dict(data)
+        return cls(
+            time=_text(data.get("time")),
+            activity=_text(data.get("activity")),
+            cost=_number(data.get("cost")),
+            tips=_text(data.get("tips"))
+        )
+
+    def to_dict(self):
+        return {"time": self.time, "activity": self.activity, "cost": self.cost, "tips": self.tips}
+
+
+@dataclass(frozen=True, slots=True)
+class Meals:
+    breakfast: str = "N/A"
+    lunch: str = "N/A"
+    dinner: str = "N/A"
+
+    @classmethod
+    def from_dict(cls, data):
+        data = _dict(data)
+        return cls(
+            breakfast=_text(data.get("breakfast"), "N/A"),
+            lunch=_text(data.get("lunch"), "N/A"),
+            dinner=_text(data.get("dinner"), "N/A")
+        )
+
+    def to_dict(self):
+        return {"breakfast": self.breakfast, "lunch": self.lunch, "dinner": self.dinner}
+
+
+@dataclass(frozen=True, slots=True)
+class Day:
+    day: int
+    title: str
+    activities: tuple = ()
+    meals: Meals = None
+    accommodation: str = ""
+    daily_cost: float = 0
+
+    @classmethod
+    def from_dict(cls, data, number=None):
+        data = _dict(data)
+        day = int(_number(data.get("day"), number or 0))
+        return cls(
+            day=day,
+            title=_text(data.get("title"), f"Day {day}"),
+            activities=tuple(Activity.from_dict(a) for a in data.get("activities") or () if isinstance(a, dict)),
+            meals=Meals.from_dict(data["meals"]) if isinstance(data.get("meals"), dict) else None,
+            accommodation=_text(data.get("accommodation")),
+            daily_cost=_number(data.get("daily_cost"))
+        )
+
+    def to_dict(self):
+        data = {
+            "day": self.day,
+            "title": self.title,
+            "activities": [activity.to_dict() for activity in self.activities],
+            "accommodation": self.accommodation,
+            "daily_cost": self.daily_cost
+        }
+        if self.meals is not None:
+            data["meals"] = self.meals.to_dict()
+        return data
+
+
+@dataclass(frozen=True, slots=True)
+class AccommodationOption:
+    name: str
+    type: str = ""
+    price_per_night: float = 0
+    tips: str = ""
+
+    @classmethod
+    def from_dict(cls, data):
+        data = _dict(data)
+        return cls(
+            name=_text(data.get("name")),
+            type=_text(data.get("type")),
+            price_per_night=_number(data.get("price_per_night")),
+            tips=_text(data.get("tips"))
+        )
+
+    def to_dict(self):
+        return {"name": self.name, "type": self.type, "price_per_night": self.price_per_night, "tips": self.tips}
+
+
+@dataclass(frozen=True, slots=True)
+class Transportation:
+    getting_there: str = "N/A"
+    local_transport: str = "N/A"
+    estimated_cost: float = 0
+
+    @classmethod
+    def from_dict(cls, data):
+        data = _dict(data)
+        return cls(
+            getting_there=_text(data.get("getting_there"), "N/A"),
+            local_transport=_text(data.get("local_transport"), "N/A"),
+            estimated_cost=_number(data.get("estimated_cost"))
+        )
+
+    def to_dict(self):
+        return {
+            "getting_there": self.getting_there,
+            "local_transport": self.local_transport,
+            "estimated_cost": self.estimated_cost
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class Itinerary:
+    """
+    Validated itinerary shared by the UI, map and PDF renderers.
+
+    Optional sections are None when the model did not provide them.
+    budget_breakdown and essential_info are tuples of (key, value) pairs;
+    list values in essential_info become tuples.
+    """
+    destination: str
+    overview: str = ""
+    total_estimated_cost: float = 0
+    daily_budget: float = 0
+    days: tuple = ()
+    budget_breakdown: tuple = None
+    money_saving_tips: tuple = None
+    accommodation_options: tuple = None
+    transportation: Transportation = None
+    essential_info: tuple = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """Validate a parsed itinerary dict; raises ValueError if it is not an itinerary"""
+        if not isinstance(data, dict):
+            raise ValueError("Itinerary must be a JSON object")
+
+        days = data.get("days") or []
+        if not isinstance(days, list):
+            raise ValueError("Itinerary 'days' must be a list")
+
+        breakdown = data.get("budget_breakdown")
+        tips = data.get("money_saving_tips")
+        options = data.get("accommodation_options")
+        info = data.get("essential_info")
+
+        return cls(
+            destination=_text(data.get("destination")),
+            overview=_text(data.get("overview")),
+            total_estimated_cost=_number(data.get("total_estimated_cost")),
+            daily_budget=_number(data.get("daily_budget")),
+            days=tuple(Day.from_dict(day, number=idx) for idx, day in enumerate(days, start=1) if isinstance(day, dict)),
+            budget_breakdown=tuple((str(k), _number(v)) for k, v in breakdown.items())
+            if isinstance(breakdown, dict) else None,
+            money_saving_tips=tuple(_text(tip) for tip in tips) if isinstance(tips, list) else None,
+            accommodation_options=tuple(AccommodationOption.from_dict(o) for o in options if isinstance(o, dict))
+            if isinstance(options, list) else None,
+            transportation=Transportation.from_dict(data["transportation"])
+            if isinstance(data.get("transportation"), dict) else None,
+            essential_info=tuple(
+                (str(k), tuple(_text(item) for item in v) if isinstance(v, list) else _text(v))
+                for k, v in info.items()
+            ) if isinstance(info, dict) else None
+        )
+
+    @classmethod
+    def coerce(cls, data):
+        """Return data as an Itinerary, converting a dict if needed"""
+        if data is None or isinstance(data, cls):
+            return data
+        return cls.from_dict(data)
+
+    def essential(self, key, default="N/A"):
+        """Look up one essential_info entry"""
+        for info_key, value in self.essential_info or ():
+            if info_key == key:
+                return value
+        return default
+
+    def to_dict(self):
+        """Plain JSON-compatible dict in the shape the model produces"""
+        data = {
+            "destination": self.destination,
+            "overview": self.overview,
+            "total_estimated_cost": self.total_estimated_cost,
+            "daily_budget": self.daily_budget,
+            "days": [day.to_dict() for day in self.days]
+        }
+        if self.budget_breakdown is not None:
+            data["budget_breakdown"] = dict(self.budget_breakdown)
+        if self.money_saving_tips is not None:
+            data["money_saving_tips"] = list(self.money_saving_tips)
+        if self.accommodation_options is not None:
+            data["accommodation_options"] = [option.to_dict() for option in self.accommodation_options]
+        if self.transportation is not None:
+            data["transportation"] = self.transportation.to_dict()
+        if self.essential_info is not None:
+            data["essential_info"] = {k: list(v) if isinstance(v, tuple) else v for k, v in self.essential_info}
+        return data
+
+    def to_bytes(self):
+        """Compact binary form, used for caching and session storage"""
+        # Itineraries repeat a lot of text, so a fast zlib pass shrinks them several-fold
+        return zlib.compress(marshal.dumps((FORMAT_VERSION, _pack_itinerary(self)), _MARSHAL_VERSION), 1)
+
+    @classmethod
+    def from_bytes(cls, payload):
+        version, packed = marshal.loads(zlib.decompress(payload))
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported itinerary format version {version}")
+        return _unpack_itinerary(packed)
+
+
+def _pack_day(day):
+    meals = None if day.meals is None else (day.meals.breakfast, day.meals.lunch, day.meals.dinner)
+    activities = tuple((a.time, a.activity, a.cost, a.tips) for a in day.activities)
+    return (day.day, day.title, activities, meals, day.accommodation, day.daily_cost)
+
+
+def _unpack_day(packed):
+    number, title, activities, meals, accommodation, daily_cost = packed
+    return Day(
+        day=number,
+        title=title,
+        activities=tuple(Activity(*a) for a in activities),
+        meals=None if meals is None else Meals(*meals),
+        accommodation=accommodation,
+        daily_cost=daily_cost
+    )
+
+
+def _pack_itinerary(itinerary):
+    options = None if itinerary.accommodation_options is None else tuple(
+        (o.name, o.type, o.price_per_night, o.tips) for o in itinerary.accommodation_options
+    )
+    transportation = None if itinerary.transportation is None else (
+        itinerary.transportation.getting_there,
+        itinerary.transportation.local_transport,
+        itinerary.transportation.estimated_cost
+    )
+    return (
+        itinerary.destination,
+        itinerary.overview,
+        itinerary.total_estimated_cost,
+        itinerary.daily_budget,
+        tuple(_pack_day(day) for day in itinerary.days),
+        itinerary.budget_breakdown,
+        itinerary.money_saving_tips,
+        options,
+        transportation,
+        itinerary.essential_info
+    )
+
+
+def _unpack_itinerary(packed):
+    (destination, overview, total_cost, daily_budget, days, breakdown,
+     tips, options, transportation, info) = packed
+    return Itinerary(
+        destination=destination,
+        overview=overview,
+        total_estimated_cost=total_cost,
+        daily_budget=daily_budget,
+        days=tuple(_unpack_day(day) for day in days),
+        budget_breakdown=breakdown,
+        money_saving_tips=tips,
+        accommodation_options=None if options is None else tuple(AccommodationOption(*o) for o in options),
+        transportation=None if transportation is None else Transportation(*transportation),
+        essential_info=info
+    )
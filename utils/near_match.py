@@ -0,0 +1,167 @@
+import copy
+import re
+import threading
+import config
+from utils import cache, singleflight
+
+_index_lock = threading.Lock()
+_DOLLARS = re.compile(r"\$(\d+(?:\.\d+)?)")
+_DAY_TITLE = re.compile(r"^Day\s+\d+", re.IGNORECASE)
+
+
+def budget_band(budget):
+    """Return the BUDGET_RANGES name a budget falls in; budgets past the last range use the last one"""
+    band = None
+    for name, (low, high) in config.BUDGET_RANGES.items():
+        band = name
+        if low <= budget < high:
+            return name
+    return band
+
+
+def _bucket_key(destination, travel_style, budget):
+    return cache.make_key(destination, travel_style, budget_band(budget))
+
+
+def _interest_set(interests):
+    if isinstance(interests, str):
+        interests = interests.split(",")
+    return {" ".join(str(i).split()).casefold() for i in interests or () if str(i).strip()}
+
+
+def _month(start_date):
+    return str(start_date)[:7] if start_date else ""
+
+
+def remember(cache_key, destination, days, budget, travel_style, interests, start_date):
+    """Add a freshly cached itinerary to the near-match index"""
+    if not config.NEAR_MATCH_ENABLED:
+        return
+
+    bucket = _bucket_key(destination, travel_style, budget)
+    entry = {
+        "key": cache_key,
+        "days": days,
+        "budget": budget,
+        "interests": sorted(_interest_set(interests)),
+        "month": _month(start_date)
+    }
+    # Worker processes share the index, so the read-modify-write holds the bucket's file lock too
+    with _index_lock, singleflight.file_lock(f"itinerary_index:{bucket}"):
+        entries = cache.get_json("itinerary_index", bucket) or []
+        entries = [e for e in entries if e.get("key") != cache_key]
+        entries.append(entry)
+        cache.set_json("itinerary_index", bucket, entries[-config.NEAR_MATCH_BUCKET_SIZE:],
+                       max_entries=config.ITINERARY_CACHE_MAX_ENTRIES)
+
+
+def _score(entry, days, budget, interests, month):
+    """Distance to a request, or None when the entry is too different to adapt"""
+    day_diff = abs(entry["days"] - days)
+    budget_diff = abs(entry["budget"] - budget) / max(budget, 1)
+    wanted = _interest_set(interests)
+    have = set(entry["interests"])
+    overlap = len(wanted & have) / len(wanted | have) if wanted | have else 1.0
+    if wanted and not have:
+        # A general itinerary (e.g. a warmed one) suits any interests, scored like the weakest accepted overlap
+        overlap = config.NEAR_MATCH_MIN_INTEREST_OVERLAP
+
+    if day_diff > config.NEAR_MATCH_MAX_DAY_DIFF or budget_diff > config.NEAR_MATCH_MAX_BUDGET_DIFF:
+        return None
+    if overlap < config.NEAR_MATCH_MIN_INTEREST_OVERLAP or entry["month"] != month:
+        return None
+    return day_diff + budget_diff + (1 - overlap)
+
+
+def find(destination, days, budget, travel_style, interests, start_date):
+    """
+    Return a cached itinerary for a similar request adapted to this one, or None.
+
+    Candidates share the destination, travel style and budget band, start in
+    the same month, and are close enough in days, budget and interests.
+    """
+    if not config.NEAR_MATCH_ENABLED or days < 1:
+        return None
+
+    entries = cache.get_json("itinerary_index", _bucket_key(destination, travel_style, budget)) or []
+    month = _month(start_date)
+    scored = []
+    for entry in entries:
+        score = _score(entry, days, budget, interests, month)
+        if score is not None:
+            scored.append((score, entry))
+
+    for _, entry in sorted(scored, key=lambda item: item[0]):
+        source = cache.get_json("itinerary", entry["key"], ttl=config.ITINERARY_CACHE_TTL)
+        if source and source.get("days"):
+            return adapt_itinerary(source, entry["days"], entry["budget"], days, budget)
+    return None
+
+
+def _scale(value, factor):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    scaled = value * factor
+    return round(scaled) if isinstance(value, int) else round(scaled, 2)
+
+
+def _scale_text(text, factor):
+    """Rescale dollar amounts such as "$45/night" inside free text"""
+    if not isinstance(text, str):
+        return text
+
+    def replace(match):
+        amount = match.group(1)
+        return f"${_scale(int(amount) if amount.isdigit() else float(amount), factor)}"
+    return _DOLLARS.sub(replace, text)
+
+
+def _fit_days(source_days, days):
+    """Trim or extend the day list, always ending on the source's last day"""
+    if days <= len(source_days):
+        return source_days[:days - 1] + source_days[-1:] if days > 1 else source_days[:1]
+
+    # Extra days repeat the middle of the trip rather than arrival or departure
+    middle = source_days[1:-1] or source_days[:-1] or source_days
+    extra = [copy.deepcopy(middle[i % len(middle)]) for i in range(days - len(source_days))]
+    return source_days[:-1] + extra + source_days[-1:]
+
+
+def adapt_itinerary(itinerary, source_days, source_budget, days, budget):
+    """Rescale a cached itinerary's costs to a new budget and trim or extend it to a new length"""
+    itinerary = copy.deepcopy(itinerary)
+    total_factor = budget / source_budget if source_budget else 1
+    # Per-day amounts also absorb the change in trip length
+    day_factor = total_factor * source_days / days
+
+    new_days = []
+    for number, day in enumerate(_fit_days(itinerary.get("days") or [], days), start=1):
+        if not isinstance(day, dict):
+            continue
+        day = copy.deepcopy(day)
+        day["day"] = number
+        day["title"] = _DAY_TITLE.sub(f"Day {number}", str(day.get("title", f"Day {number}")))
+        day["daily_cost"] = _scale(day.get("daily_cost", 0), day_factor)
+        day["accommodation"] = _scale_text(day.get("accommodation"), day_factor)
+        for activity in day.get("activities") or []:
+            if isinstance(activity, dict):
+                activity["cost"] = _scale(activity.get("cost", 0), day_factor)
+        if isinstance(day.get("meals"), dict):
+            day["meals"] = {meal: _scale_text(text, day_factor) for meal, text in day["meals"].items()}
+        new_days.append(day)
+    itinerary["days"] = new_days
+
+    itinerary["total_estimated_cost"] = _scale(itinerary.get("total_estimated_cost", source_budget), total_factor)
+    itinerary["daily_budget"] = round(budget / days, 2)
+    if isinstance(itinerary.get("overview"), str):
+        itinerary["overview"] = itinerary["overview"].replace(f"{source_days}-day", f"{days}-day")
+    if isinstance(itinerary.get("budget_breakdown"), dict):
+        itinerary["budget_breakdown"] = {k: _scale(v, total_factor) for k, v in itinerary["budget_breakdown"].items()}
+    for option in itinerary.get("accommodation_options") or []:
+        if isinstance(option, dict):
+            option["price_per_night"] = _scale(option.get("price_per_night", 0), day_factor)
+    if isinstance(itinerary.get("transportation"), dict):
+        transportation = itinerary["transportation"]
+        transportation["estimated_cost"] = _scale(transportation.get("estimated_cost", 0), total_factor)
+
+    return itinerary
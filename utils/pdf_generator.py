@@ -1,81 +1,123 @@
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+import io
+from functools import lru_cache
 import config
 from datetime import datetime
+from utils import cache, metrics
+from utils.models import Itinerary
 
-def generate_itinerary_pdf(itinerary_data, filename="travel_itinerary.pdf"):
+# Bump when the layout changes so cached PDFs are re-rendered
+PDF_RENDERER_VERSION = "3"
+
+_memory_cache = cache.LRUCache(config.PDF_MEMORY_CACHE_ITEMS, max_bytes=config.PDF_MEMORY_CACHE_BYTES)
+
+
+@lru_cache(maxsize=1)
+def _get_styles():
+    """Build the paragraph and table styles once per process"""
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import TableStyle
+    
+    styles = getSampleStyleSheet()
+    
+    def table_style(background):
+        return TableStyle([
+            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor(background)),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey)
+        ])
+    
+    return {
+        'body': styles['BodyText'],
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor('#2E86AB'),
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold'
+        ),
+        'heading': ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=16,
+            textColor=colors.HexColor('#A23B72'),
+            spaceAfter=12,
+            spaceBefore=12,
+            fontName='Helvetica-Bold'
+        ),
+        'subheading': ParagraphStyle(
+            'CustomSubHeading',
+            parent=styles['Heading3'],
+            fontSize=14,
+            textColor=colors.HexColor('#F18F01'),
+            spaceAfter=10,
+            fontName='Helvetica-Bold'
+        ),
+        'tip': ParagraphStyle('Tip', parent=styles['BodyText'],
+                              leftIndent=20, textColor=colors.HexColor('#666666'),
+                              fontSize=9),
+        'footer': ParagraphStyle('Footer', parent=styles['BodyText'],
+                                 alignment=TA_CENTER, fontSize=8,
+                                 textColor=colors.grey),
+        'budget_table': table_style('#F0F0F0'),
+        'breakdown_table': table_style('#E8F4F8')
+    }
+
+
+def generate_itinerary_pdf(itinerary_data, filename=None):
     """
-    Generate a PDF document of the travel itinerary
+    Generate a PDF document of the travel itinerary in memory.
+    Accepts an Itinerary or an itinerary dict. Returns the PDF bytes, and also
+    writes them to filename when one is given.
     """
-    doc = SimpleDocTemplate(filename, pagesize=letter,
+    # reportlab is only loaded by sessions that actually export a PDF
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, PageBreak
+    
+    itinerary = Itinerary.coerce(itinerary_data)
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter,
                            rightMargin=72, leftMargin=72,
                            topMargin=72, bottomMargin=18)
     
     # Container for the 'Flowable' objects
     elements = []
     
-    # Define styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#2E86AB'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor=colors.HexColor('#A23B72'),
-        spaceAfter=12,
-        spaceBefore=12,
-        fontName='Helvetica-Bold'
-    )
-    
-    subheading_style = ParagraphStyle(
-        'CustomSubHeading',
-        parent=styles['Heading3'],
-        fontSize=14,
-        textColor=colors.HexColor('#F18F01'),
-        spaceAfter=10,
-        fontName='Helvetica-Bold'
-    )
+    # Shared styles
+    style_set = _get_styles()
+    body_style = style_set['body']
+    title_style = style_set['title']
+    heading_style = style_set['heading']
+    subheading_style = style_set['subheading']
+    tip_style = style_set['tip']
     
     # Title
-    elements.append(Paragraph(f"Travel Itinerary: {itinerary_data['destination']}", title_style))
+    elements.append(Paragraph(f"Travel Itinerary: {itinerary.destination}", title_style))
     elements.append(Spacer(1, 0.2*inch))
     
     # Overview
     elements.append(Paragraph("Trip Overview", heading_style))
-    elements.append(Paragraph(itinerary_data.get('overview', 'Your personalized travel adventure!'), styles['BodyText']))
+    elements.append(Paragraph(itinerary.overview or 'Your personalized travel adventure!', body_style))
     elements.append(Spacer(1, 0.2*inch))
     
     # Budget Summary
     elements.append(Paragraph("Budget Summary", heading_style))
     budget_data = [
-        ['Total Budget:', f"${itinerary_data.get('total_estimated_cost', 0)}"],
-        ['Daily Budget:', f"${itinerary_data.get('daily_budget', 0)}"],
-        ['Number of Days:', f"{len(itinerary_data.get('days', []))} days"]
+        ['Total Budget:', f"${itinerary.total_estimated_cost}"],
+        ['Daily Budget:', f"${itinerary.daily_budget}"],
+        ['Number of Days:', f"{len(itinerary.days)} days"]
     ]
     
     budget_table = Table(budget_data, colWidths=[3*inch, 2*inch])
-    budget_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#F0F0F0')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey)
-    ]))
+    budget_table.setStyle(style_set['budget_table'])
     
     elements.append(budget_table)
     elements.append(Spacer(1, 0.3*inch))
@@ -84,100 +126,116 @@ def generate_itinerary_pdf(itinerary_data, filename="travel_itinerary.pdf"):
     elements.append(Paragraph("Daily Itinerary", heading_style))
     elements.append(Spacer(1, 0.1*inch))
     
-    for day in itinerary_data.get('days', []):
-        elements.append(Paragraph(f"Day {day['day']}: {day['title']}", subheading_style))
+    for day in itinerary.days:
+        elements.append(Paragraph(f"Day {day.day}: {day.title}", subheading_style))
         
         # Activities
-        for activity in day.get('activities', []):
-            activity_text = f"<b>{activity['time']}</b> - {activity['activity']}"
-            if activity.get('cost'):
-                activity_text += f" (${activity['cost']})"
-            elements.append(Paragraph(activity_text, styles['BodyText']))
+        for activity in day.activities:
+            activity_text = f"<b>{activity.time}</b> - {activity.activity}"
+            if activity.cost:
+                activity_text += f" (${activity.cost})"
+            elements.append(Paragraph(activity_text, body_style))
             
-            if activity.get('tips'):
-                tip_style = ParagraphStyle('Tip', parent=styles['BodyText'], 
-                                          leftIndent=20, textColor=colors.HexColor('#666666'),
-                                          fontSize=9)
-                elements.append(Paragraph(f"💡 {activity['tips']}", tip_style))
+            if activity.tips:
+                elements.append(Paragraph(f"💡 {activity.tips}", tip_style))
         
         elements.append(Spacer(1, 0.1*inch))
         
         # Meals
-        if day.get('meals'):
-            meals_text = f"<b>Meals:</b> Breakfast: {day['meals'].get('breakfast', 'N/A')}, " \
-                        f"Lunch: {day['meals'].get('lunch', 'N/A')}, " \
-                        f"Dinner: {day['meals'].get('dinner', 'N/A')}"
-            elements.append(Paragraph(meals_text, styles['BodyText']))
+        if day.meals:
+            meals_text = f"<b>Meals:</b> Breakfast: {day.meals.breakfast}, " \
+                        f"Lunch: {day.meals.lunch}, " \
+                        f"Dinner: {day.meals.dinner}"
+            elements.append(Paragraph(meals_text, body_style))
         
         # Accommodation
-        if day.get('accommodation'):
-            elements.append(Paragraph(f"<b>Accommodation:</b> {day['accommodation']}", styles['BodyText']))
+        if day.accommodation:
+            elements.append(Paragraph(f"<b>Accommodation:</b> {day.accommodation}", body_style))
         
         # Daily cost
-        if day.get('daily_cost'):
-            elements.append(Paragraph(f"<b>Estimated Daily Cost:</b> ${day['daily_cost']}", styles['BodyText']))
+        if day.daily_cost:
+            elements.append(Paragraph(f"<b>Estimated Daily Cost:</b> ${day.daily_cost}", body_style))
         
         elements.append(Spacer(1, 0.2*inch))
     
     # Budget Breakdown
-    if 'budget_breakdown' in itinerary_data:
+    if itinerary.budget_breakdown is not None:
         elements.append(PageBreak())
         elements.append(Paragraph("Budget Breakdown", heading_style))
         
-        breakdown = itinerary_data['budget_breakdown']
-        breakdown_data = [[k.replace('_', ' ').title(), f"${v}"] for k, v in breakdown.items()]
+        breakdown_data = [[k.replace('_', ' ').title(), f"${v}"] for k, v in itinerary.budget_breakdown]
         
         breakdown_table = Table(breakdown_data, colWidths=[3*inch, 2*inch])
-        breakdown_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#E8F4F8')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey)
-        ]))
+        breakdown_table.setStyle(style_set['breakdown_table'])
         
         elements.append(breakdown_table)
         elements.append(Spacer(1, 0.2*inch))
     
     # Money Saving Tips
-    if 'money_saving_tips' in itinerary_data:
+    if itinerary.money_saving_tips is not None:
         elements.append(Paragraph("Money Saving Tips 💰", heading_style))
-        for tip in itinerary_data['money_saving_tips']:
-            elements.append(Paragraph(f"• {tip}", styles['BodyText']))
+        for tip in itinerary.money_saving_tips:
+            elements.append(Paragraph(f"• {tip}", body_style))
         elements.append(Spacer(1, 0.2*inch))
     
     # Transportation
-    if 'transportation' in itinerary_data:
+    if itinerary.transportation is not None:
         elements.append(Paragraph("Transportation", heading_style))
-        trans = itinerary_data['transportation']
-        elements.append(Paragraph(f"<b>Getting There:</b> {trans.get('getting_there', 'N/A')}", styles['BodyText']))
-        elements.append(Paragraph(f"<b>Local Transport:</b> {trans.get('local_transport', 'N/A')}", styles['BodyText']))
-        elements.append(Paragraph(f"<b>Estimated Cost:</b> ${trans.get('estimated_cost', 0)}", styles['BodyText']))
+        trans = itinerary.transportation
+        elements.append(Paragraph(f"<b>Getting There:</b> {trans.getting_there}", body_style))
+        elements.append(Paragraph(f"<b>Local Transport:</b> {trans.local_transport}", body_style))
+        elements.append(Paragraph(f"<b>Estimated Cost:</b> ${trans.estimated_cost}", body_style))
         elements.append(Spacer(1, 0.2*inch))
     
     # Essential Info
-    if 'essential_info' in itinerary_data:
+    if itinerary.essential_info is not None:
         elements.append(Paragraph("Essential Information", heading_style))
-        info = itinerary_data['essential_info']
         
-        for key, value in info.items():
-            if isinstance(value, list):
-                elements.append(Paragraph(f"<b>{key.replace('_', ' ').title()}:</b>", styles['BodyText']))
+        for key, value in itinerary.essential_info:
+            if isinstance(value, tuple):
+                elements.append(Paragraph(f"<b>{key.replace('_', ' ').title()}:</b>", body_style))
                 for item in value:
-                    elements.append(Paragraph(f"• {item}", styles['BodyText']))
+                    elements.append(Paragraph(f"• {item}", body_style))
             else:
-                elements.append(Paragraph(f"<b>{key.replace('_', ' ').title()}:</b> {value}", styles['BodyText']))
+                elements.append(Paragraph(f"<b>{key.replace('_', ' ').title()}:</b> {value}", body_style))
     
     # Footer
     elements.append(Spacer(1, 0.5*inch))
     footer_text = f"Generated by {config.APP_TITLE} on {datetime.now().strftime('%B %d, %Y')}"
-    footer_style = ParagraphStyle('Footer', parent=styles['BodyText'], 
-                                 alignment=TA_CENTER, fontSize=8, 
-                                 textColor=colors.grey)
-    elements.append(Paragraph(footer_text, footer_style))
+    elements.append(Paragraph(footer_text, style_set['footer']))
     
     # Build PDF
-    doc.build(elements)
-    return filename
\ No newline at end of file
+    # Layout and rendering happen here; building the flowables above is cheap
+    with metrics.span("pdf_build") as span:
+        doc.build(elements)
+        span["days"] = len(itinerary.days)
+    pdf_bytes = buffer.getvalue()
+    
+    if filename:
+        with open(filename, "wb") as f:
+            f.write(pdf_bytes)
+    
+    return pdf_bytes
+
+
+def get_itinerary_pdf(itinerary_data):
+    """
+    Return the PDF bytes for an itinerary, rendering it only when no identical
+    itinerary has been rendered today by this or another worker.
+    """
+    # The footer carries the generation date, so it is part of the key
+    itinerary = Itinerary.coerce(itinerary_data)
+    key = cache.make_key(PDF_RENDERER_VERSION, datetime.now().strftime('%Y-%m-%d'),
+                         cache.content_hash(itinerary))
+    
+    pdf_bytes = _memory_cache.get(key)
+    if pdf_bytes is None:
+        pdf_bytes = cache.cache_get("pdf", key, ttl=config.PDF_CACHE_TTL)
+        if pdf_bytes is None:
+            pdf_bytes = generate_itinerary_pdf(itinerary)
+            cache.cache_set("pdf", key, pdf_bytes, max_bytes=config.PDF_CACHE_MAX_BYTES)
+        else:
+            pdf_bytes = bytes(pdf_bytes)
+        _memory_cache.set(key, pdf_bytes)
+    
+    return pdf_bytes
@@ -0,0 +1,35 @@
+import json
+import os
+import time
+import config
+from utils.metrics import append_jsonl
+
+
+def record(request):
+    """Append a trip request to the request log, used to learn which trips to pre-generate"""
+    if not config.REQUEST_LOG_ENABLED:
+        return
+
+    entry = dict(request, ts=time.time())
+    try:
+        append_jsonl(config.REQUEST_LOG_PATH, entry, config.REQUEST_LOG_MAX_BYTES)
+    except OSError as e:
+        print(f"Error writing request log: {e}")
+
+
+def load(since=None):
+    """Return logged requests, optionally only those made after the since timestamp"""
+    requests = []
+    # The rotated file holds the older requests
+    for path in (f"{config.REQUEST_LOG_PATH}.1", config.REQUEST_LOG_PATH):
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and (since is None or entry.get("ts", 0) >= since):
+                    requests.append(entry)
+    return requests
@@ -0,0 +1,212 @@
+import dataclasses
+import itertools
+import re
+import numpy as np
+from utils.map_helper import get_coordinates, place_query
+from utils.models import Itinerary
+
+EARTH_RADIUS_KM = 6371.0088
+# Up to this many points between the ends, every order is tried (7! = 5040 paths)
+EXACT_ROUTE_POINTS = 7
+
+# Activities tied to a time of day keep their slot when a day is reordered
+_TIME_BOUND = re.compile(r"\b(?:breakfast|brunch|lunch|dinner|sunrise|sunset|evening|night|nightlife)\b",
+                         re.IGNORECASE)
+
+
+def distance_matrix(coords):
+    """Great-circle distances in km between every pair of (lat, lon) points, as an n x n array"""
+    points = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2))
+    lat = points[:, 0]
+    lon = points[:, 1]
+    a = np.sin((lat[:, None] - lat[None, :]) / 2) ** 2 \
+        + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin((lon[:, None] - lon[None, :]) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def route_length(coords):
+    """Length in km of the path through (lat, lon) points in the given order"""
+    if len(coords) < 2:
+        return 0.0
+    matrix = distance_matrix(coords)
+    steps = np.arange(len(coords) - 1)
+    return float(matrix[steps, steps + 1].sum())
+
+
+def _nearest_neighbor(matrix, first, last):
+    """Greedy path from first to last through every other point"""
+    remaining = np.ones(len(matrix), dtype=bool)
+    remaining[[first, last]] = False
+    path = [first]
+    for _ in range(int(remaining.sum())):
+        step = int(np.where(remaining, matrix[path[-1]], np.inf).argmin())
+        path.append(step)
+        remaining[step] = False
+    path.append(last)
+    return np.array(path)
+
+
+def _two_opt(matrix, path):
+    """Reverse segments of the path while that shortens it; the end points stay in place"""
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(path) - 2):
+            # Gain of reversing path[i..j] for every j at once
+            a, b = path[i - 1], path[i]
+            c, d = path[i + 1:-1], path[i + 2:]
+            gains = matrix[a, b] + matrix[c, d] - matrix[a, c] - matrix[b, d]
+            best = int(gains.argmax())
+            if gains[best] > 1e-9:
+                j = i + 1 + best
+                path[i:j + 1] = path[i:j + 1][::-1]
+                improved = True
+    return path
+
+
+def _exact(matrix, first, last):
+    """Shortest path from first to last through every other point, by trying every order at once"""
+    inner = [point for point in range(len(matrix)) if point not in (first, last)]
+    if not inner:
+        return np.array([first, last])
+    orders = np.array(list(itertools.permutations(inner)), dtype=int).reshape(-1, len(inner))
+    paths = np.hstack([np.full((len(orders), 1), first), orders, np.full((len(orders), 1), last)])
+    lengths = matrix[paths[:, :-1], paths[:, 1:]].sum(axis=1)
+    return paths[int(lengths.argmin())]
+
+
+def order_route(matrix, start=None, end=None):
+    """
+    Short visiting order of the points of a distance matrix. start and end,
+    when given, stay first and last; otherwise the path may begin or finish
+    anywhere. Small routes are solved exactly. Larger ones get 2-opt applied
+    to both the nearest-neighbour path and the given order, whichever ends up
+    shorter, so the result is never longer than the input order.
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    size = len(matrix)
+    if size < 2:
+        return list(range(size))
+    # An open end is a dummy point at zero distance from all others, so one routine handles every case
+    dummies = (start is None) + (end is None)
+    full = np.zeros((size + dummies, size + dummies))
+    full[:size, :size] = matrix
+    first = size if start is None else start
+    last = size + dummies - 1 if end is None else end
+
+    if len(full) - 2 <= EXACT_ROUTE_POINTS:
+        return [int(point) for point in _exact(full, first, last) if point < size]
+
+    given = np.array([first] + [point for point in range(size) if point not in (first, last)] + [last])
+    paths = [_two_opt(full, _nearest_neighbor(full, first, last)), _two_opt(full, given)]
+    path = min(paths, key=lambda p: full[p[:-1], p[1:]].sum())
+    return [int(point) for point in path if point < size]
+
+
+def _anchor(stops, position, step):
+    """Coordinates of the nearest located stop from position onwards in direction step"""
+    while 0 <= position < len(stops):
+        if stops[position] is not None:
+            return stops[position]
+        position += step
+    return None
+
+
+def optimize_day(day, coordinates, destination):
+    """
+    Reorder a day's activities into a shorter route. Returns (day, before_km, after_km).
+
+    The day keeps its time slots in order and activities move between them.
+    Activities tied to a time of day or without coordinates stay in their
+    slot, and the others are only reordered between them. The route starts
+    and ends at the day's accommodation when it has been located.
+    """
+    activities = list(day.activities)
+    points = [coordinates.get(place_query(destination, a.activity)) or None for a in activities]
+    home = None
+    if day.accommodation:
+        home = coordinates.get(place_query(destination, day.accommodation)) or None
+    pinned = [point is None or bool(_TIME_BOUND.search(a.activity)) for a, point in zip(activities, points)]
+
+    # With the accommodation at both ends, anchors can be looked up the same way for every segment
+    stops = [home] + [point if fixed else None for point, fixed in zip(points, pinned)] + [home]
+    order = list(range(len(activities)))
+    position = 0
+    while position < len(activities):
+        if pinned[position]:
+            position += 1
+            continue
+        segment_end = position
+        while segment_end + 1 < len(activities) and not pinned[segment_end + 1]:
+            segment_end += 1
+
+        if segment_end > position:
+            segment = list(range(position, segment_end + 1))
+            start, end = _anchor(stops, position, -1), _anchor(stops, segment_end + 2, 1)
+            route = ([start] if start else []) + [points[idx] for idx in segment] + ([end] if end else [])
+            visit = order_route(distance_matrix(route),
+                                start=0 if start else None,
+                                end=len(route) - 1 if end else None)
+            offset = 1 if start else 0
+            order[position:segment_end + 1] = [segment[idx - offset] for idx in visit
+                                               if offset <= idx < offset + len(segment)]
+        position = segment_end + 1
+
+    def length(sequence):
+        route = [home] + [points[idx] for idx in sequence] + [home]
+        return route_length([point for point in route if point])
+
+    before, after = length(range(len(activities))), length(order)
+    if after >= before - 1e-9:
+        return day, before, before
+
+    reordered = tuple(dataclasses.replace(activities[idx], time=activities[slot].time)
+                      for slot, idx in enumerate(order))
+    return dataclasses.replace(day, activities=reordered), before, after
+
+
+def optimize_itinerary(itinerary_data, coordinates):
+    """
+    Reorder every day of an itinerary with optimize_day. coordinates maps
+    geocoder queries to (lat, lon), as map_helper.locate_places returns them.
+    Returns (itinerary, report) with the straight-line km before and after per day.
+    """
+    itinerary = Itinerary.coerce(itinerary_data)
+    days = []
+    report = {"days": [], "before_km": 0.0, "after_km": 0.0}
+    for day in itinerary.days:
+        optimized, before, after = optimize_day(day, coordinates, itinerary.destination)
+        days.append(optimized)
+        report["days"].append({"day": day.day, "before_km": round(before, 2), "after_km": round(after, 2),
+                               "reordered": optimized is not day})
+        report["before_km"] += before
+        report["after_km"] += after
+
+    report["saved_km"] = round(report["before_km"] - report["after_km"], 2)
+    report["before_km"] = round(report["before_km"], 2)
+    report["after_km"] = round(report["after_km"], 2)
+    return dataclasses.replace(itinerary, days=tuple(days)), report
+
+
+def order_cities(cities, keep_first=True):
+    """
+    Order the cities of a multi-city trip so the overland legs stay short.
+    The first city stays first unless keep_first is False; cities that can't
+    be located go last. Returns (cities, before_km, after_km).
+    """
+    cities = list(cities)
+    located = []
+    missing = []
+    for city in cities:
+        coords = get_coordinates(city)
+        (located if coords != (0, 0) else missing).append((city, coords))
+    if len(located) < 2:
+        return cities, 0.0, 0.0
+
+    points = [coords for _, coords in located]
+    visit = order_route(distance_matrix(points), start=0 if keep_first and located[0][0] == cities[0] else None)
+    before = route_length(points)
+    after = route_length([points[idx] for idx in visit])
+    if after >= before - 1e-9:
+        return cities, before, before
+    return [located[idx][0] for idx in visit] + [city for city, _ in missing], before, after
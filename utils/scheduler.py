@@ -0,0 +1,142 @@
+import asyncio
+import contextvars
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import config
+
+# Session on whose behalf model calls in the current context are made
+current_session = contextvars.ContextVar("current_session", default=None)
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a model call waited longer than the queue timeout"""
+
+
+class SessionLimitError(Exception):
+    """Raised when a session already has too many model calls queued or running"""
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control for model calls.
+
+    At most max_concurrent calls run at once. Waiting calls are admitted in
+    strict FIFO order, each session may have at most per_session_limit calls
+    queued or running, and a call that cannot start within the timeout fails.
+    """
+
+    def __init__(self, max_concurrent, per_session_limit=None, timeout=None, expected_call_seconds=10.0):
+        self.max_concurrent = max_concurrent
+        self.per_session_limit = per_session_limit
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._active = 0
+        self._session_counts = {}
+        self._tickets = itertools.count()
+        self._avg_call_seconds = expected_call_seconds
+
+    def acquire(self, session_id=None, timeout=None):
+        """Wait for a free slot and return a ticket to pass to release()"""
+        timeout = self.timeout if timeout is None else timeout
+
+        with self._cond:
+            if session_id is not None and self.per_session_limit is not None \
+                    and self._session_counts.get(session_id, 0) >= self.per_session_limit:
+                raise SessionLimitError("Too many itinerary requests in progress for this session")
+
+            ticket = (next(self._tickets), session_id)
+            self._queue.append(ticket)
+            self._add_session(session_id, 1)
+
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self._queue[0] != ticket or self._active >= self.max_concurrent:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._queue.remove(ticket)
+                    self._add_session(session_id, -1)
+                    self._cond.notify_all()
+                    raise QueueTimeoutError("The planner is busy right now, please try again shortly")
+                self._cond.wait(remaining)
+
+            self._queue.popleft()
+            self._active += 1
+            # The next ticket in line may also fit if there are free slots
+            self._cond.notify_all()
+            return ticket, time.monotonic()
+
+    async def aacquire(self, session_id=None, timeout=None):
+        """
+        acquire() for coroutines. The wait runs on a worker thread, which can't
+        be interrupted, so if the caller is cancelled meanwhile the slot it
+        eventually gets is released again.
+        """
+        waiting = asyncio.ensure_future(asyncio.to_thread(self.acquire, session_id, timeout))
+        try:
+            return await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            waiting.add_done_callback(self._release_abandoned)
+            raise
+
+    def _release_abandoned(self, waiting):
+        if not waiting.cancelled() and waiting.exception() is None:
+            self.release(waiting.result())
+
+    def release(self, ticket):
+        """Free the slot held by a ticket from acquire()"""
+        (_, session_id), started = ticket
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._active -= 1
+            self._add_session(session_id, -1)
+            self._avg_call_seconds = 0.8 * self._avg_call_seconds + 0.2 * elapsed
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, session_id=None, timeout=None):
+        """Hold a slot for the duration of a model call"""
+        if session_id is None:
+            session_id = current_session.get()
+        ticket = self.acquire(session_id, timeout=timeout)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def position(self, session_id):
+        """Return (position, estimated_wait_seconds) of the session's first queued call, or None"""
+        with self._cond:
+            for idx, (_, queued_session) in enumerate(self._queue):
+                if queued_session == session_id:
+                    waves = idx // self.max_concurrent + 1
+                    return idx + 1, round(waves * self._avg_call_seconds, 1)
+        return None
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active": self._active,
+                "queued": len(self._queue),
+                "max_concurrent": self.max_concurrent,
+                "avg_call_seconds": round(self._avg_call_seconds, 2)
+            }
+
+    def _add_session(self, session_id, delta):
+        if session_id is None:
+            return
+        count = self._session_counts.get(session_id, 0) + delta
+        if count > 0:
+            self._session_counts[session_id] = count
+        else:
+            self._session_counts.pop(session_id, None)
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrent=config.LLM_MAX_CONCURRENT_CALLS,
+    per_session_limit=config.LLM_PER_SESSION_LIMIT,
+    timeout=config.LLM_QUEUE_TIMEOUT,
+    expected_call_seconds=config.LLM_EXPECTED_CALL_SECONDS
+)
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process coalescing is available
+    fcntl = None
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+class Call:
+    """A pending result shared by every caller of the same key"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._error = None
+
+    @property
+    def done(self):
+        return self._event.is_set()
+
+    def resolve(self, result):
+        self._result = result
+        self._event.set()
+
+    def fail(self, error):
+        self._error = error
+        self._event.set()
+
+    def wait(self, timeout=None):
+        """Block until the leader finishes and return its result"""
+        if not self._event.wait(timeout):
+            raise TimeoutError("Timed out waiting for an in-flight request")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+def acquire(key):
+    """Return (call, is_leader); only the leader should do the work for key"""
+    with _calls_lock:
+        call = _calls.get(key)
+        if call is not None:
+            return call, False
+        call = Call()
+        _calls[key] = call
+        return call, True
+
+
+def release(key, call):
+    """Forget the leader's call; waiters are failed if it was never resolved"""
+    with _calls_lock:
+        if _calls.get(key) is call:
+            del _calls[key]
+    if not call.done:
+        call.fail(RuntimeError("In-flight request was abandoned"))
+
+
+def do(key, fn):
+    """Run fn once for all concurrent callers of key in this process and share its result"""
+    call, leader = acquire(key)
+    if not leader:
+        return call.wait()
+
+    try:
+        result = fn()
+        call.resolve(result)
+        return result
+    except Exception as e:
+        call.fail(e)
+        raise
+    finally:
+        release(key, call)
+
+
+@contextmanager
+def file_lock(key):
+    """Hold an exclusive lock on key shared by every process using the same cache directory"""
+    if fcntl is None or not config.CACHE_ENABLED:
+        yield
+        return
+
+    lock_dir = os.path.join(os.path.dirname(os.path.abspath(config.CACHE_DB_PATH)), "locks")
+    os.makedirs(lock_dir, exist_ok=True)
+    name = hashlib.sha256(str(key).encode("utf-8")).hexdigest()[:32]
+
+    with open(os.path.join(lock_dir, f"{name}.lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
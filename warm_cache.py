@@ -0,0 +1,180 @@
+"""
+Pre-generate itineraries, coordinates and maps for popular trips so peak-hour
+requests are served from the cache.
+
+Usage:
+    python warm_cache.py --from-log
+    python warm_cache.py --destinations popular.txt --durations 5 3 7 --max-calls 200
+    python warm_cache.py --from-log --now
+
+The trips to warm come either from the request log the app writes (the most
+frequent destination, style, duration and budget-band combinations over the
+last WARM_LOG_WINDOW_DAYS) or from a ranked destinations file, one per line,
+crossed with config.TRAVEL_STYLES and the given durations. Warmed trips start
+WARM_LEAD_DAYS from today, like the app's default start date, so nearby
+requests are also served by near-match reuse.
+
+The warmer waits for the WARM_OFF_PEAK_HOURS window unless --now is given,
+stops when the window closes or the model call budget is spent, and generates
+one trip at a time through the regular rate-limited client.
+"""
+import argparse
+import math
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+import config
+from utils import near_match, request_log
+from utils.ai_helper import generate_itinerary, get_cached_itinerary
+from utils.map_helper import get_travel_map_html
+
+
+def load_destinations(path):
+    """Read a ranked destinations file, one per line; blank lines and # comments are skipped"""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def _start_date():
+    return (datetime.now() + timedelta(days=config.WARM_LEAD_DAYS)).strftime("%Y-%m-%d")
+
+
+def plan_from_destinations(destinations, durations=None, budget=None):
+    """Cross ranked destinations with every travel style and duration, best-ranked first"""
+    durations = durations or config.WARM_DURATIONS
+    budget = budget or config.WARM_BUDGET
+    start_date = _start_date()
+    return [
+        dict(destination=destination, days=days, budget=budget, travel_style=style,
+             interests="", start_date=start_date)
+        for destination in destinations
+        for days in durations
+        for style in config.TRAVEL_STYLES
+    ]
+
+
+def plan_from_log(window_days=None, limit=None):
+    """Rank the trips in the request log by how often they were asked for"""
+    window_days = config.WARM_LOG_WINDOW_DAYS if window_days is None else window_days
+    since = time.time() - window_days * 24 * 60 * 60
+    groups = {}
+
+    for entry in request_log.load(since=since):
+        try:
+            days = int(entry["days"])
+            budget = int(float(entry["budget"]))
+            destination = " ".join(str(entry["destination"]).split())
+            style = str(entry["travel_style"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        key = (destination.casefold(), style, days, near_match.budget_band(budget))
+        group = groups.setdefault(key, {"count": 0, "destination": Counter(), "budget": Counter(), "interests": Counter()})
+        group["count"] += 1
+        group["destination"][destination] += 1
+        group["budget"][budget] += 1
+        group["interests"][str(entry.get("interests") or "").strip()] += 1
+
+    start_date = _start_date()
+    ranked = sorted(groups.items(), key=lambda item: item[1]["count"], reverse=True)
+    return [
+        dict(destination=group["destination"].most_common(1)[0][0], days=days,
+             budget=group["budget"].most_common(1)[0][0], travel_style=style,
+             interests=group["interests"].most_common(1)[0][0], start_date=start_date)
+        for (_, style, days, _), group in ranked[:limit or config.WARM_TOP_REQUESTS]
+    ]
+
+
+def estimated_calls(days):
+    """Model calls needed to generate a trip: one, or a skeleton plus one per chunk for long trips"""
+    if days <= config.CHUNK_DAYS:
+        return 1
+    return 1 + math.ceil(days / config.CHUNK_DAYS)
+
+
+def in_off_peak(now=None):
+    start, end = config.WARM_OFF_PEAK_HOURS
+    hour = (now or datetime.now()).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def wait_for_off_peak():
+    """Sleep until the off-peak window opens"""
+    now = datetime.now()
+    if in_off_peak(now):
+        return
+    opens = now.replace(hour=config.WARM_OFF_PEAK_HOURS[0], minute=0, second=0, microsecond=0)
+    if opens <= now:
+        opens += timedelta(days=1)
+    print(f"Waiting for the off-peak window at {opens:%Y-%m-%d %H:%M}")
+    time.sleep((opens - now).total_seconds())
+
+
+def warm(plan, max_calls=None, respect_window=True):
+    """Warm every trip in the plan that isn't cached yet, within the model call budget"""
+    max_calls = config.WARM_LLM_CALL_BUDGET if max_calls is None else max_calls
+    stats = {"already_warm": 0, "generated": 0, "failed": 0, "skipped": 0, "calls": 0}
+
+    for request in plan:
+        if respect_window and not in_off_peak():
+            print("Off-peak window closed, stopping")
+            break
+
+        itinerary = get_cached_itinerary(**request)
+        if itinerary is not None:
+            stats["already_warm"] += 1
+        else:
+            calls = estimated_calls(request["days"])
+            if stats["calls"] + calls > max_calls:
+                stats["skipped"] += 1
+                continue
+            # The attempt spends model calls whether or not it succeeds
+            stats["calls"] += calls
+            try:
+                # A template fallback would be reported as warmed without caching anything
+                itinerary = generate_itinerary(**request, fallback=False)
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"[failed] {request['destination']} {request['days']}d {request['travel_style']}: {e}")
+                continue
+            stats["generated"] += 1
+            print(f"[generated] {request['destination']} {request['days']}d {request['travel_style']}")
+
+        # Geocoder lookups are rate limited by the map helper's shared resolver
+        destination = itinerary.get("destination") or request["destination"]
+        get_travel_map_html(destination, itinerary)
+
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate itineraries and maps for popular trips")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--from-log", action="store_true", help="Warm the most requested trips from the request log")
+    source.add_argument("--destinations", help="File of ranked destinations, one per line")
+    parser.add_argument("--durations", type=int, nargs="+", default=None, help="Trip lengths to warm per destination")
+    parser.add_argument("--budget", type=int, default=None, help="Budget used for destination-file trips")
+    parser.add_argument("--max-calls", type=int, default=None, help="Model call budget for this run")
+    parser.add_argument("--now", action="store_true", help="Run immediately, ignoring the off-peak window")
+    args = parser.parse_args(argv)
+
+    if config.ANTHROPIC_API_KEY == "your-api-key-here":
+        print("No API key configured; template itineraries are not cached, nothing to warm")
+        return 1
+
+    if args.from_log:
+        plan = plan_from_log()
+    else:
+        plan = plan_from_destinations(load_destinations(args.destinations), args.durations, args.budget)
+    print(f"{len(plan)} trips to warm")
+
+    if not args.now:
+        wait_for_off_peak()
+    stats = warm(plan, max_calls=args.max_calls, respect_window=not args.now)
+    print(f"Done: {stats['generated']} generated with ~{stats['calls']} model calls, "
+          f"{stats['already_warm']} already warm, {stats['failed']} failed, {stats['skipped']} over budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())